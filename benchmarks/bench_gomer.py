@@ -0,0 +1,173 @@
+"""Micro-benchmarks of the command and video hot paths of the SDK.
+
+Gomer is simulated by the loopback backend with no latency, so the numbers are the
+overhead of the SDK itself. Results are printed as JSON, compare them across releases:
+
+    python benchmarks/bench_gomer.py --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the SDK prints while importing and connecting, keep stdout for the results
+with contextlib.redirect_stdout(sys.stderr):
+    from gomer import VERSION, codec
+    from gomer.config import Config
+    from gomer.frames import FrameRing
+    from gomer.message import Content, ContentCode, Message, MessageType, ResultCode, SDKRequestMessage
+    from gomer.transceiver import Handler, MessageSender
+
+
+def timed(fn, number):
+    """run fn number times, return the mean time of a call in microseconds."""
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def latencies(fn, number):
+    """run fn number times, return statistics of each call in microseconds."""
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return dict(mean_us=statistics.mean(samples), p50_us=samples[len(samples) // 2],
+                p99_us=samples[int(len(samples) * 0.99)], max_us=samples[-1], calls=number)
+
+
+def bench_message(number):
+    content = Content(item=ContentCode.TURN.value, prm1=2, prm2=90, prm3=3000)
+    message = SDKRequestMessage(content=content, block='auto', group='wheel')
+    complete = {'seq': 1001, 'msgtype': MessageType.REQUEST.value,
+                'sdks': {'num': 1001, 'item': ContentCode.DETECT_FACE.value, 'result': ResultCode.SUCCESS.value,
+                         'prmstr1': '{"face0": [140, 60, 40, 40, 99]}'}}
+    raw = json.dumps(complete).encode()
+    return {
+        'content_construct_us': timed(
+            lambda: Content(item=ContentCode.TURN.value, prm1=2, prm2=90, prm3=3000), number),
+        'message_construct_us': timed(
+            lambda: SDKRequestMessage(content=Content(item=ContentCode.TURN.value, prm1=2, prm2=90, prm3=3000),
+                                      block='auto', group='wheel'), number),
+        'message_str_us': timed(lambda: str(message), number),
+        'message_encode_us': timed(message.encode, number),
+        'message_from_dict_us': timed(lambda: Message.from_dict(complete), number),
+        'message_parse_raw_us': timed(lambda: Message.from_dict(codec.loads(raw)), number),
+    }
+
+
+def bench_handler(number):
+    """dispatch a response and a complete message for each of number live messages."""
+    sender = MessageSender()
+    handler = Handler(sender)
+    handler.checked = True
+    messages = []
+    raws = []
+    for _ in range(number):
+        content = Content(item=ContentCode.INFRARED.value, prm1=1)
+        message = SDKRequestMessage(content=content, block='never')
+        messages.append(message)
+        num = content.num
+        raws.append(json.dumps({'seq': num, 'msgtype': MessageType.RESPONSE.value, 'code': ResultCode.SUCCESS.value,
+                                'sdks': {'num': num, 'item': content.item}}).encode())
+        raws.append(json.dumps({'seq': num, 'msgtype': MessageType.REQUEST.value,
+                                'sdks': {'num': num, 'item': content.item, 'result': ResultCode.SUCCESS.value,
+                                         'prm1': 1, 'prm2': 2048}}).encode())
+    with sender.state.lock:
+        for message in messages:
+            sender.state.add_item(message)
+    start = time.perf_counter()
+    for raw in raws:
+        handler.dispatch(raw)
+    elapsed = time.perf_counter() - start
+    return {'dispatch_messages': len(raws), 'dispatch_us': elapsed / len(raws) * 1e6,
+            'dispatch_per_second': len(raws) / elapsed}
+
+
+def bench_send(robot, number):
+    """end-to-end latency of MessageSender.send against the loopback, per block mode."""
+    sender = robot._sender
+    results = {}
+    for block, group in (('never', 'wheel'), ('auto', 'wheel'), ('all', None)):
+        def send():
+            content = Content(item=ContentCode.TURN.value, prm1=2, prm2=90, prm3=3000)
+            sender.send(SDKRequestMessage(content=content, block=block, group=group)).result()
+        results[block] = latencies(send, number)
+    results['request'] = latencies(lambda: robot.read_infrared('front'), number)
+    return results
+
+
+def bench_video(robot, number):
+    """YUV conversions of Video, per frame. uncached ones convert the frame again on every call."""
+    import numpy as np
+    width, height = 1280, 720
+    frames = FrameRing(2, width, height)
+    yuv = np.random.randint(0, 256, width * height * 3 // 2, np.uint8)
+    frame = frames.put(yuv.ctypes.data, width, height)
+    video = robot._video
+    video.frames = frames
+
+    def uncached(**options):
+        def convert():
+            frame.cache.clear()
+            video.get_image(wait_new=False, copy=False, **options)
+        return convert
+    return {
+        'get_image': latencies(uncached(), number),
+        'get_image_cached': latencies(lambda: video.get_image(wait_new=False, copy=False), number),
+        'get_image_cached_copy': latencies(lambda: video.get_image(wait_new=False), number),
+        'get_image_320x180': latencies(uncached(size=(320, 180)), number),
+        'get_image_roi_320x180': latencies(uncached(roi=(480, 270, 320, 180)), number),
+        'get_gray_320x180': latencies(lambda: video.get_gray(wait_new=False, size=(320, 180)), number),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=2000, help='calls of each micro-benchmark')
+    parser.add_argument('--sends', type=int, default=300, help='calls of each end-to-end benchmark')
+    parser.add_argument('--frames', type=int, default=100, help='frames converted by the video benchmark')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    logging.getLogger('gomer').setLevel(logging.WARNING)
+    config = Config()
+    config.set('glproto', 'backend', 'loopback')
+    for option in ('latency', 'jitter', 'execution_time'):
+        config.set('loopback', option, 0)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from gomer.robot import Robot
+        robot = Robot('Gomer_loopback')
+
+    results = {
+        'sdk_version': VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'json_backend': codec.BACKEND,
+        'message': bench_message(args.number),
+        'handler': bench_handler(args.number),
+        'send': bench_send(robot, args.sends),
+        'video': bench_video(robot, args.frames),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,9 @@ __all__ = [
     'exceptions',
     'message',
     'motion',
-    'robot'
+    'robot',
+    'async_robot',
+    'fleet'
 ]
 
 import os
@@ -0,0 +1,534 @@
+from .motion import *
+from .transceiver import *
+from .player import *
+from .sensor import *
+from .face_detection import *
+from .hardware import *
+from .screen import *
+from .uploader import *
+from .emotion import *
+from .pattern_detection import *
+from .video import *
+from .robot import Robot
+import asyncio
+import logging
+
+
+class AsyncRobot(object):
+    """asyncio version of Robot, every method talking to Gomer is a coroutine.
+
+    messages from Gomer are handed to the event loop, so sensing, speech and motion can run
+    concurrently in one loop without a thread per instruction:
+
+        async with AsyncRobot('Gomer_a2dc6e') as robot:
+            await asyncio.gather(robot.turn(2, 90), robot.tts('hello', 'hello'), robot.read_infrared('front'))
+
+    parameters and results are the same as in Robot. motion methods return the asyncio future of
+    the instruction, awaiting it waits until the instruction is over.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self._logger = logging.getLogger('gomer.async_robot')
+        self.__handler = None
+        self._connection = Connection()
+        self._loop = None
+        self._sender = None
+        self._frame_publisher = None
+        self._host_face_detection = None
+        self._scene_gate = None
+        self._face_tracker = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        """connect gomer, messages from gomer will be dispatched on the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._sender = AsyncMessageSender(self._loop, self._connection)
+        self.__handler = Handler(self._sender)
+        self._connection.set_receiver(self.__receive)
+        await self._loop.run_in_executor(None, self._connection.connect, self.__name)
+        self._hardware = Hardware(self._sender)
+        self._hardware.check_version()
+        try:
+            await self._loop.run_in_executor(None, self.__handler.wait_version)
+        except GomerNeedsUpdate:
+            self._connection.set_receiver()
+            self._connection.destroy()
+            raise
+
+        self._wheel = Wheel(self._sender)
+        self._forearm = Forearm(self._sender)
+        self._arm = Arm(self._sender)
+        self._head = Head(self._sender)
+        self._paw = Paw(self._sender)
+
+        self._player = Player(self._sender)
+        self._screen = Screen(self._sender)
+        self._sensor = Sensor(self._sender)
+        self._uploader = Uploader(self._sender)
+
+        self._emotion = Emotion(self._sender)
+        self._face_detection = FaceDetection(self._sender)
+        self._video = Video(self._sender)
+        self._pattern_detection = PatternDetection(self._sender)
+        return self
+
+    async def close(self):
+        """destroy connection with gomer."""
+        if self._sender is not None:
+            await self.stop_face_tracking()
+            await self.stop_host_face_detection()
+            await self.stop_recording()
+            await self.stop_publishing_frames()
+        self._connection.set_receiver()
+        self._connection.destroy()
+
+    def __receive(self, message):
+        # called on the thread of LibGlproto
+        self._loop.call_soon_threadsafe(self.__dispatch, message)
+
+    def __dispatch(self, message):
+        try:
+            self.__handler.dispatch(message)
+        except Exception:
+            self._logger.exception('fail to dispatch message: {}'.format(message))
+
+    # Sensors (including gyroscope, infrared, cliff_detection) and Lights
+    async def set_light_color(self, r=255, g=255, b=255):
+        """see Robot.set_light_color"""
+        await self._sensor.set_light_color(r, g, b)
+
+    async def set_light_mode(self, mode='on', duration=3000, on_time=1000, off_time=1000):
+        """see Robot.set_light_mode"""
+        await self._sensor.set_light_mode(mode, duration, on_time, off_time)
+
+    async def light_on(self):
+        """open light"""
+        await self._sensor.light_on()
+
+    async def light_off(self):
+        """light off"""
+        await self._sensor.light_off()
+
+    async def turn_on_cliff_detection(self):
+        await self._sensor.turn_on_cliff_detection()
+
+    async def turn_off_cliff_detection(self):
+        await self._sensor.turn_off_cliff_detection()
+
+    async def read_infrared(self, location):
+        """see Robot.read_infrared"""
+        return await self._sensor.read_infrared(location)
+
+    async def read_gyroscope(self):
+        """see Robot.read_gyroscope"""
+        return await self._sensor.read_gyroscope()
+
+    async def read_gyroscope2(self):
+        """see Robot.read_gyroscope2"""
+        w, x, y, z = await self._sensor.read_gyroscope()
+        return self._sensor.quaternion_to_euler_angles(w, x, y, z)
+
+    # Motion (including wheels, arm, forearm, head, hand)
+    async def move_in_open_loop(self, speed, timeout=3000, block='auto'):
+        """see Robot.move_in_open_loop"""
+        return await self._wheel.move(speed, timeout, block=block)
+
+    async def straight_move(self, speed, distance, timeout=3000, block='auto'):
+        """see Robot.straight_move"""
+        return await self._wheel.move_directly(speed, distance, timeout=timeout, block=block)
+
+    async def turn(self, speed, angle, timeout=3000, block='auto'):
+        """see Robot.turn"""
+        return await self._wheel.turn(speed, angle, timeout=timeout, block=block)
+
+    async def forearm_move_in_open_loop(self, speed, timeout=3000, block='auto'):
+        """see Robot.forearm_move_in_open_loop"""
+        return await self._forearm.open_loop_move(speed, timeout, block)
+
+    async def forearm_move(self, speed, angle, timeout=3000, block='auto'):
+        """see Robot.forearm_move"""
+        return await self._forearm.closed_loop_move(speed, angle, timeout=timeout, block=block)
+
+    async def arm_move_in_open_loop(self, speed, timeout=3000, block='auto'):
+        """see Robot.arm_move_in_open_loop"""
+        return await self._arm.open_loop_move(speed, timeout, block)
+
+    async def arm_move(self, speed, angle, timeout=3000, block='auto'):
+        """see Robot.arm_move"""
+        return await self._arm.closed_loop_move(speed, angle, timeout=timeout, block=block)
+
+    async def head_move_in_open_loop(self, speed, timeout=3000, block='auto'):
+        """see Robot.head_move_in_open_loop"""
+        return await self._head.open_loop_move(speed, timeout=timeout, block=block)
+
+    async def head_move(self, speed, angle, timeout=3000, block='auto'):
+        """see Robot.head_move"""
+        return await self._head.closed_loop_move(speed, angle, timeout=timeout, block=block)
+
+    async def paw_move_in_open_loop(self, speed, timeout=3000, block='auto'):
+        """see Robot.paw_move_in_open_loop"""
+        return await self._paw.open_loop_move(speed, timeout, block)
+
+    async def paw_move(self, speed, angle, timeout=3000, block='auto'):
+        """see Robot.paw_move"""
+        return await self._paw.closed_loop_move(speed, angle, timeout=timeout, block=block)
+
+    # player module
+    async def tts(self, string, filename):
+        """see Robot.tts"""
+        await self._player.tts(string, filename)
+
+    async def play(self, filename):
+        """see Robot.play"""
+        await self._player.play_file(filename)
+
+    async def get_play_status(self):
+        """see Robot.get_play_status"""
+        return await self._player.get_play_status()
+
+    async def set_volume(self, volume):
+        """see Robot.set_volume"""
+        await self._player.set_volume(volume)
+
+    async def get_volume(self):
+        """see Robot.get_volume"""
+        return await self._player.get_volume()
+
+    async def stop_playing(self):
+        """stop a voice"""
+        await self._player.stop()
+
+    # File operations
+    async def upload(self, path):
+        """see Robot.upload, the file is sent in a worker thread."""
+        await self._loop.run_in_executor(None, self._uploader.upload, path)
+
+    # Screen
+    async def show_image(self, image):
+        """see Robot.show_image"""
+        await self._screen.show_image(image)
+
+    async def get_show_status(self):
+        """see Robot.get_show_status"""
+        return await self._screen.is_showing()
+
+    async def show_camera(self):
+        """Gomer will show camera in his face."""
+        await self._screen.show_camera()
+
+    async def stop_showing(self):
+        """stop screen show of gomer."""
+        await self._screen.stop_showing()
+
+    # Emotion
+    async def play_emotion(self, emotion):
+        """see Robot.play_emotion"""
+        await self._emotion.play_emotion(emotion)
+
+    def turn_on_expression(self):
+        """when Gomer is playing emotion, turn on the expression in face"""
+        self._emotion.turn_on_expression()
+
+    def turn_off_expression(self):
+        """when Gomer is playing emotion, turn off the expression in face"""
+        self._emotion.turn_off_expression()
+
+    def turn_on_motion(self):
+        """when Gomer is playing emotion, turn on the motion of wheels and arms"""
+        self._emotion.turn_on_motion()
+
+    def turn_off_motion(self):
+        """when Gomer is playing emotion, turn off the motion of wheels and arms"""
+        self._emotion.turn_off_motion()
+
+    async def stop_emotion(self):
+        await self._emotion.stop()
+
+    async def get_emotion_status(self):
+        """see Robot.get_emotion_status"""
+        return await self._emotion.is_showing()
+
+    # face-detection
+    async def detect_face(self, min_size=10, max_size=300):
+        """see Robot.detect_face"""
+        if self._scene_gate is None:
+            return await self._face_detection.detect_face(min_size, max_size)
+        hit, value = self._scene_gate.check('face', (min_size, max_size))
+        if hit:
+            return value
+        faces = await self._face_detection.detect_face(min_size, max_size)
+        self._scene_gate.store('face', (min_size, max_size), value, faces)
+        return faces
+
+    async def enable_scene_gate(self, threshold=0.005, pixel_threshold=20, max_age=None):
+        """see Robot.enable_scene_gate"""
+        from .scene_gate import SceneGate
+        if not self._video.open:
+            await self.open_video_data()
+        self._scene_gate = SceneGate(self._connection.frames, threshold, pixel_threshold, max_age=max_age)
+
+    def get_scene_gate_stats(self):
+        """see Robot.get_scene_gate_stats"""
+        if self._scene_gate is None:
+            return None
+        return self._scene_gate.get_stats()
+
+    def disable_scene_gate(self):
+        """see Robot.disable_scene_gate"""
+        stats = self.get_scene_gate_stats()
+        self._scene_gate = None
+        return stats
+
+    async def start_host_face_detection(self, workers=None, min_size=10, max_size=300, model=None):
+        """see Robot.start_host_face_detection"""
+        from .host_face_detection import HostFaceDetection
+        await self.stop_host_face_detection()
+        if not self._video.open:
+            await self.open_video_data()
+        detection = await self._loop.run_in_executor(None, lambda: HostFaceDetection(
+            self._connection.frames, workers, min_size=min_size, max_size=max_size, model=model))
+        self._host_face_detection = detection.start()
+
+    async def detect_face_on_host(self, wait_new=True, timeout=None):
+        """see Robot.detect_face_on_host, the faces are waited for in an executor."""
+        if self._host_face_detection is None:
+            return None
+        if not wait_new:
+            return self._host_face_detection.get_faces(False)
+        return await self._loop.run_in_executor(None, self._host_face_detection.get_faces, True, timeout)
+
+    async def stop_host_face_detection(self):
+        """see Robot.stop_host_face_detection"""
+        if self._host_face_detection is None:
+            return None
+        detection, self._host_face_detection = self._host_face_detection, None
+        return await self._loop.run_in_executor(None, detection.stop)
+
+    async def get_face_feature(self, index):
+        """see Robot.get_face_feature"""
+        return await self._face_detection.get_face_feature(index)
+
+    async def detect_and_identify(self, min_size=10, max_size=300, numpy=False):
+        """see Robot.detect_and_identify"""
+        faces = await self.detect_face(min_size, max_size)
+        results = await asyncio.gather(*[self._sender.request(message, parse)
+                                         for message, parse in self._face_detection.identify_requests()])
+        return FaceDetection.identities(faces, results, numpy)
+
+    async def register_face(self, index, name):
+        """see Robot.register_face"""
+        await self.__load_face_list()
+        index, deleted = self._face_detection.plan_register(index, name)
+        if deleted is not None:
+            await self._face_detection.delete_face(deleted)
+        await self._face_detection.send_register(index, name)
+
+    async def get_name(self, index):
+        """see Robot.get_name"""
+        return await self._face_detection.get_name(index)
+
+    async def generate_face_feature_file(self, index, filename):
+        """see Robot.generate_face_feature_file"""
+        await self._face_detection.set_face_feature_file(index, filename)
+
+    async def calc_similarity(self, name1, name2):
+        """see Robot.calc_similarity"""
+        similarity = self._face_detection.get_similarity(name1, name2)
+        # cached similarities are returned at once
+        return await similarity if asyncio.isfuture(similarity) else similarity
+
+    async def similarity_matrix(self, names, others=None):
+        """see Robot.similarity_matrix"""
+        generation, requests = self._face_detection.similarity_requests(names, others)
+        results = await asyncio.gather(*[self._sender.request(message) for _, message in requests])
+        self._face_detection.store_similarities(generation, [pair for pair, _ in requests], results)
+        return self._face_detection.cached_similarity_matrix(names, others)
+
+    async def rename(self, old_name, new_name):
+        """see Robot.rename"""
+        await self.__load_face_list()
+        await self._face_detection.rename(old_name, new_name)
+
+    async def get_face_list(self):
+        """see Robot.get_face_list, the faces are got from gomer at the first call."""
+        await self.__load_face_list()
+        return self._face_detection.get_face_list()
+
+    async def sync_face_list(self):
+        """see Robot.sync_face_list"""
+        return await self._face_detection.load_face_list()
+
+    async def delete_face(self, name):
+        """see Robot.delete_face"""
+        await self.__load_face_list()
+        await self._face_detection.delete_face(name)
+
+    async def __load_face_list(self):
+        if not self._face_detection.face_list_loaded():
+            await self._face_detection.load_face_list()
+
+    async def start_face_tracking(self, gain=0.5, max_rate=5, head=True, fov=(60, 34)):
+        """see Robot.start_face_tracking, the commands are sent on the running loop."""
+        from .face_tracker import FaceTracker
+        await self.stop_face_tracking()
+        loop = self._loop
+        if self._host_face_detection is not None:
+            faces = lambda timeout: self._host_face_detection.get_faces(True, timeout)
+        else:
+            faces = lambda timeout: asyncio.run_coroutine_threadsafe(self.detect_face(), loop).result()
+        turn = lambda speed, angle, block: asyncio.run_coroutine_threadsafe(self.turn(speed, angle, block=block), loop)
+        head_move = lambda speed, angle, block: asyncio.run_coroutine_threadsafe(
+            self.head_move(speed, angle, block=block), loop)
+        self._face_tracker = FaceTracker(faces, turn, head_move if head else None, fov=fov, gain=gain,
+                                         max_rate=max_rate).start()
+
+    async def stop_face_tracking(self):
+        """see Robot.stop_face_tracking"""
+        if self._face_tracker is None:
+            return None
+        tracker, self._face_tracker = self._face_tracker, None
+        return await self._loop.run_in_executor(None, tracker.stop)
+
+    async def turn_to_face(self):
+        """When gomer detect only 1 face, he can turn to the face."""
+        width = 320
+        faces = await self.detect_face()
+
+        if faces:
+            face = faces[0]
+            x = face[0] + face[2] / 2
+            diff_x = x - width / 2
+            if diff_x < -20:
+                await self._turn_and_see(-10, diff_x)
+            elif diff_x > 20:
+                await self._turn_and_see(10, diff_x)
+            else:
+                print('already turn to face.')
+                return
+        else:
+            print('can not see the face.')
+
+    async def _turn_and_see(self, angle, diff_x):
+        width = 320
+        await self.turn(2, angle)
+        n_faces = await self.detect_face()
+        if n_faces:
+            n_face = n_faces[0]
+            n_x = n_face[0] + n_face[2] / 2
+            n_diff_x = n_x - width / 2
+            if n_diff_x < -20:
+                diff_angle = Robot._calc_diff_angle2(10, diff_x, n_diff_x)
+                await self.turn(2, -diff_angle)
+            elif n_diff_x > 20:
+                diff_angle = Robot._calc_diff_angle2(10, diff_x, n_diff_x)
+                await self.turn(2, diff_angle)
+
+    # pattern detection
+    async def detect_pattern(self, group, min_size=10, max_size=300):
+        """see Robot.detect_pattern"""
+        if self._scene_gate is None:
+            return await self._pattern_detection.detect_pattern(group=group, min_size=min_size, max_size=max_size)
+        args = (min_size, max_size, group)
+        hit, value = self._scene_gate.check('pattern', args)
+        if hit:
+            return value
+        patterns = await self._pattern_detection.detect_pattern(*args)
+        self._scene_gate.store('pattern', args, value, patterns)
+        return patterns
+
+    async def get_pattern_location(self, index=0):
+        """see Robot.get_pattern_location"""
+        return await self._pattern_detection.get_pattern_location(index)
+
+    async def add_custom_pattern(self, pattern_name):
+        """see Robot.add_custom_pattern"""
+        await self._pattern_detection.add_pattern(pattern_name)
+
+    async def get_custom_patterns(self):
+        """see Robot.get_custom_patterns"""
+        return await self._pattern_detection.get_custom_patterns()
+
+    async def move_to_pattern(self, pattern_name, distance, times=5):
+        """see Robot.move_to_pattern"""
+        for i in range(times):
+            result = await self._pattern_detection.move_to_pattern(pattern=pattern_name, distance=distance)
+            if not result:
+                return
+            head, turn_1, move, turn_2 = result
+            if head != 255:
+                await self.head_move(2, head)
+            if turn_1 != 0:
+                await self.turn(2, turn_1)
+            if move != 0:
+                await self.straight_move(2, move)
+            if turn_2 != 0:
+                await self.turn(2, turn_2)
+
+    # video
+    async def open_video(self):
+        """see Robot.open_video"""
+        self._video.open_video()
+
+    async def close_video(self):
+        """close video"""
+        self._video.close_video()
+
+    async def open_video_data(self):
+        """see Robot.open_video_data"""
+        self._video.open_video_data(self._connection.frames)
+
+    async def close_video_data(self):
+        """close video data stream"""
+        self._video.close_video_data()
+
+    def frames(self, max_fps=None, every_nth=1, size=None, color='bgr', roi=None):
+        """see Robot.frames, iterate over it with async for."""
+        if not self._video.open:
+            self._video.open_video_data(self._connection.frames)
+        return FrameStream(self._video, max_fps, every_nth, size, color, roi)
+
+    async def publish_frames(self, name=None, slots=4):
+        """see Robot.publish_frames"""
+        from .shared_frames import SharedFramePublisher
+        await self.stop_publishing_frames()
+        if not self._video.open:
+            await self.open_video_data()
+        self._frame_publisher = SharedFramePublisher(name, slots)
+        self._connection.video_sinks.append(self._frame_publisher)
+        return self._frame_publisher.name
+
+    async def stop_publishing_frames(self):
+        """see Robot.stop_publishing_frames"""
+        if self._frame_publisher is None:
+            return
+        self._connection.video_sinks.remove(self._frame_publisher)
+        self._frame_publisher.close()
+        self._frame_publisher = None
+
+    async def start_recording(self, path, fps=25, size=None):
+        """see Robot.start_recording"""
+        if not self._video.open:
+            await self.open_video_data()
+        await self._loop.run_in_executor(None, self._video.start_recording, path, fps, size)
+
+    async def stop_recording(self):
+        """see Robot.stop_recording"""
+        return await self._loop.run_in_executor(None, self._video.stop_recording)
+
+    async def get_image_from_video(self, wait_new=True, timeout=None, size=None, roi=None, color='bgr', copy=True):
+        """see Robot.get_image_from_video, the new frame is waited for in an executor."""
+        if not wait_new:
+            return self._video.get_image(False, None, size, roi, color, copy)
+        return await self._loop.run_in_executor(None, self._video.get_image, True, timeout, size, roi, color, copy)
+
+    async def get_gray_from_video(self, wait_new=True, timeout=None, size=None, roi=None):
+        """see Robot.get_gray_from_video"""
+        if not wait_new:
+            return self._video.get_gray(False, None, size, roi)
+        return await self._loop.run_in_executor(None, self._video.get_gray, True, timeout, size, roi)
@@ -3,7 +3,7 @@ from .transceiver import MessageSender
 
 
 class BaseFunction(object):
-    def __init__(self):
+    def __init__(self, sender=None):
         self.logger = logging.getLogger('gomer.base_function')
-        self.sender = MessageSender()
+        self.sender = sender if sender is not None else MessageSender()
         self.block_mode_set = ('auto', 'never', 'all')
@@ -0,0 +1,56 @@
+"""JSON codec of the messages between the SDK and gomer.
+
+messages are encoded straight to bytes from a fixed field order. orjson or ujson is used
+when it is installed, json otherwise.
+"""
+import json
+import operator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    dumps = orjson.dumps
+    loads = orjson.loads
+elif ujson is not None:
+    BACKEND = 'ujson'
+
+    def dumps(obj):
+        return ujson.dumps(obj).encode()
+
+    loads = ujson.loads
+else:
+    BACKEND = 'json'
+    _encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def dumps(obj):
+        return _encode(obj).encode()
+
+    loads = json.loads
+
+# fields of Content, in the order they are sent
+CONTENT_FIELDS = ('num', 'item', 'prm1', 'prm2', 'prm3', 'prm4', 'prm5',
+                  'prmstr1', 'prmstr2', 'prmstr3', 'prmstr4', 'prmstr5', 'result')
+CONTENT_FIELD_SET = frozenset(CONTENT_FIELDS)
+_content_values = operator.attrgetter(*CONTENT_FIELDS)
+
+
+def content_to_dict(content):
+    """fields of content which are not None, in CONTENT_FIELDS order."""
+    return {field: value for field, value in zip(CONTENT_FIELDS, _content_values(content)) if value is not None}
+
+
+def encode(message):
+    """bytes of a Message sent to gomer."""
+    if message.code:
+        return dumps({"seq": message.sequence, "msgtype": message.message_type, "code": message.code})
+    return dumps({"seq": message.sequence, "msgtype": message.message_type,
+                  message.key: content_to_dict(message.content)})
@@ -16,15 +16,66 @@ class Config(object):
         return Config._instance
 
     def __init__(self):
+        # config.ini is read once, Config() is called again and again for the shared instance
+        if hasattr(self, 'config'):
+            return
+        self.logger = logging.getLogger('gomer.config')
         # get config.ini path
         path = self.__get_path()
-        self.config = configparser.ConfigParser()
-        self.config.read(path, encoding='utf-8')
-        self.logger = logging.getLogger('gomer.config')
+        config = configparser.ConfigParser()
+        config.read(path, encoding='utf-8')
+        self.config = config
+
+    def set(self, section, option, value):
+        """override an option of config.ini in this process, e.g. Config().set('glproto', 'backend', 'loopback')"""
+        if not self.config.has_section(section):
+            self.config.add_section(section)
+        self.config.set(section, option, str(value))
 
     def get_glproto(self):
         return os.path.join(home, self.config.get('glproto', 'path'))
 
+    def get_backend(self):
+        return self.config.get('glproto', 'backend', fallback='dll')
+
+    def get_loopback(self):
+        """options of LoopbackGlproto"""
+        section = 'loopback'
+        return dict(latency=self.config.getfloat(section, 'latency', fallback=0.005),
+                    jitter=self.config.getfloat(section, 'jitter', fallback=0.002),
+                    execution_time=self.config.getfloat(section, 'execution_time', fallback=0.02),
+                    drop_rate=self.config.getfloat(section, 'drop_rate', fallback=0.0),
+                    video_fps=self.config.getfloat(section, 'video_fps', fallback=25))
+
+    def get_ready_time(self):
+        """seconds to wait for gomer after connecting"""
+        if self.get_backend() == 'loopback':
+            return 0
+        return 4
+
+    def get_window(self):
+        return self.config.getint('sender', 'window', fallback=8)
+
+    def get_frame_slots(self):
+        """frames of the video data kept for consumers falling behind"""
+        return self.config.getint('video', 'frame_slots', fallback=4)
+
+    def get_response_timeout(self):
+        """seconds gomer may take to respond an instruction, 0 for no limit"""
+        return self.config.getfloat('sender', 'response_timeout', fallback=10)
+
+    def get_timeout(self):
+        """seconds gomer may take to complete an instruction without a timeout parameter, 0 for no limit"""
+        return self.config.getfloat('sender', 'timeout', fallback=60)
+
+    def get_open_ended_timeout(self):
+        """seconds gomer may take to complete tts, playing files, notes and emotions, 0 for no limit"""
+        return self.config.getfloat('sender', 'open_ended_timeout', fallback=0)
+
+    def get_timeout_margin(self):
+        """seconds added to the timeout parameter of an instruction for the delay of the network"""
+        return self.config.getfloat('sender', 'timeout_margin', fallback=2)
+
     # get file path of config.ini
 
     def __get_path(self):
@@ -1,42 +1,100 @@
 from ctypes import *
 from .config import Config
-from .exceptions import NoDevicesFound
+from .exceptions import NoDevicesFound, ConnectionInUse
+from .frames import FrameRing
 import logging
 import threading
 from queue import Queue
 import time
 
+MessageCallback = CFUNCTYPE(c_int, c_char_p, c_int)
+VideoCallback = CFUNCTYPE(c_int, POINTER(c_ubyte), c_int, c_int)
+FileCallback = CFUNCTYPE(c_int, c_int)
+
+# argtypes and restype of the functions of LibGlproto, see docs/glproto.h
+PROTOTYPES = {
+    'ProtocolSearchDevice': ((POINTER(c_int), POINTER(c_char_p)), c_int),
+    'ProtocolConnectDevice': ((c_char_p, MessageCallback), c_int),
+    'ProtocolDestroyConnect': ((), c_int),
+    'ProtocolSendMessage': ((c_char_p,), c_int),
+    'ProtocolSendFileBlock': ((c_int, c_char_p), c_int),
+    'ProtocolSendFileUnblock': ((c_int, c_char_p, FileCallback), c_int),
+    'ProtocolOpenVideo': ((VideoCallback,), c_int),
+    'ProtocolCloseVideo': ((), c_int),
+    'ProtocolOpenVideoAndDisplay': ((), c_int),
+    'ProtocolCloseVideoAndDisplay': ((), c_int),
+}
+
+_dlls = {}
+_dlls_lock = threading.Lock()
+
+
+def load_glproto(path):
+    """LibGlproto at path with all its functions bound to their prototypes, loaded once per process."""
+    with _dlls_lock:
+        lib = _dlls.get(path)
+        if lib is None:
+            lib = CDLL(path)
+            for name, (argtypes, restype) in PROTOTYPES.items():
+                function = getattr(lib, name)
+                function.argtypes = argtypes
+                function.restype = restype
+            _dlls[path] = lib
+        return lib
+
 
 class Connection:
-    _instance_lock = threading.Lock()
-    message_queue = Queue()
-    yuvs = Queue()
-
-    @CFUNCTYPE(c_int, POINTER(c_ubyte), c_int, c_int)
-    def receive_video_data(yuv_file, width, height):
-        yuv = string_at(yuv_file, int(width * height * 3 / 2))
-        Connection.yuvs.put_nowait(yuv)
+    """connection with one gomer, with its own queues of messages and video data from gomer.
+
+    LibGlproto64.dll keeps a single connection, so only one Connection of a process can be connected
+    through the dll. every Connection of the loopback backend simulates a gomer of its own.
+    """
+    # the Connection connected through the dll
+    _dll_owner = None
+    _dll_lock = threading.Lock()
+
+    def __init__(self):
+        self.logger = logging.getLogger('gomer.connection')
+        self.message_queue = Queue()
+        self.frames = FrameRing(Config().get_frame_slots())
+        # more objects taking the video data by put(pointer, width, height), e.g. SharedFramePublisher
+        self.video_sinks = []
+        # called with every message from gomer, on the thread of LibGlproto.
+        self.receiver = self.message_queue.put
+        # ctypes callbacks given to LibGlproto, they must live as long as the connection
+        self.receive = MessageCallback(self.__receive)
+        self.receive_video_data = VideoCallback(self.__receive_video_data)
+        self.receive_upload_result = FileCallback(self.__receive_upload_result)
+        self.backend = Config().get_backend()
+        self.__lib = self.__load(self.backend)
+        # the hot path, c_char_p takes the encoded message as it is
+        self.__send_message = self.__lib.ProtocolSendMessage
+
+    def __receive(self, message, len):
+        self.receiver(message)
         return 0
 
-    @CFUNCTYPE(c_int, c_char_p, c_int)
-    def receive(message, len):
-        Connection.message_queue.put(message)
+    def __receive_video_data(self, yuv_file, width, height):
+        self.frames.put(yuv_file, width, height)
+        for sink in self.video_sinks:
+            sink.put(yuv_file, width, height)
         return 0
 
-    @CFUNCTYPE(c_int, c_int)
-    def receive_upload_result(self, result):
+    @staticmethod
+    def __receive_upload_result(result):
         return 0
 
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(Connection, '_instance'):
-            with Connection._instance_lock:
-                if not hasattr(Connection, '_instance'):
-                    Connection._instance = object.__new__(cls)
-        return Connection._instance
+    def set_receiver(self, receiver=None):
+        """hand messages from gomer to receiver instead of the message queue, receiver must be thread-safe."""
+        self.receiver = receiver if receiver is not None else self.message_queue.put
 
-    def __init__(self):
-        self.logger = logging.getLogger('gomer.connection')
-        self.__lib = CDLL(Config().get_glproto())
+    @staticmethod
+    def __load(backend):
+        config = Config()
+        if backend == 'loopback':
+            from .loopback import LoopbackGlproto
+            return LoopbackGlproto(**config.get_loopback())
+        return load_glproto(config.get_glproto())
 
     def __search(self):
         num = c_int()
@@ -48,39 +106,63 @@ class Connection:
             raise NoDevicesFound('No gomer can be found, please check wifi connection of your PC!')
 
     def connect(self, name):
-        self.__search()
-        name_p = c_char_p(name.encode())
-
-        res = self.__lib.ProtocolConnectDevice(name_p, self.receive)
+        if self.backend != 'loopback':
+            with Connection._dll_lock:
+                if Connection._dll_owner not in (None, self):
+                    raise ConnectionInUse('LibGlproto64.dll connects one gomer per process, '
+                                          'use the loopback backend or one process per gomer.')
+                Connection._dll_owner = self
+        res = 0
+        try:
+            self.__search()
+            res = self.__lib.ProtocolConnectDevice(name.encode(), self.receive)
+        finally:
+            if res != 1:
+                # not connected, another connection may try again
+                self.__release()
         if res == 1:
             self.logger.info('Connect {} success...'.format(name))
             print('connect success')
         # waiting for ready
-        time.sleep(4)
+        time.sleep(Config().get_ready_time())
+
+    def __release(self):
+        with Connection._dll_lock:
+            if Connection._dll_owner is self:
+                Connection._dll_owner = None
+
+    def __owns_dll(self):
+        with Connection._dll_lock:
+            return Connection._dll_owner is self
 
     # destroy connection with Gomer
     def destroy(self):
+        if self.__lib is None:
+            return
+        if self.backend != 'loopback' and not self.__owns_dll():
+            # the dll connects another Connection, e.g. connect() raised ConnectionInUse, leave it alone
+            self.__lib = None
+            return
         res = self.__lib.ProtocolDestroyConnect()
+        self.__release()
         if res == 0:
             self.__lib = None
             return
 
     def send(self, message):
-        message_p = create_string_buffer(message.encode())
-        self.__lib.ProtocolSendMessage(message_p)
+        if isinstance(message, str):
+            message = message.encode()
+        self.__send_message(message)
 
     def upload(self, file_type, path):
-        path_p = c_char_p(path.encode())
-
-        res = self.__lib.ProtocolSendFileBlock(file_type, path_p)
+        res = self.__lib.ProtocolSendFileBlock(file_type, path.encode())
         if res == 1:
             return
         else:
             print('error uploading, error code is {}'.format(res))
 
     def upload_async(self, file_type, path):
-        path_p = c_char_p(path.encode())
-        self.__lib.ProtocolSendFileUnblock(file_type, path_p, self.receive_upload_result)
+        self.__lib.ProtocolSendFileUnblock(file_type, path.encode(), self.receive_upload_result)
 
     def open_video_data(self):
         self.__lib.ProtocolOpenVideo(self.receive_video_data)
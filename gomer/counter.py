@@ -1,7 +1,17 @@
+import itertools
 import threading
 
+# nums and seqs are ints of gomer, they wrap around to FIRST after LAST
+FIRST = 1001
+LAST = (1 << 31) - 1
+_span = LAST - FIRST + 1
+
 
 class Counter(object):
+    """allocates the content nums and the message seqs sent to gomer.
+
+    next() of itertools.count is atomic, so nums and seqs are unique across threads without a lock.
+    """
     _instance_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
@@ -12,14 +22,27 @@ class Counter(object):
         return Counter._instance
 
     def __init__(self):
-        self.__sequence = 1000
+        # Counter() is called again for the shared instance, don't restart its counts
+        if hasattr(self, '_Counter__nums'):
+            return
+        self.__nums = itertools.count()
+        self.__sequences = itertools.count()
 
     def generate_sequence(self):
-        self.__sequence += 1
-        return self.__sequence
+        """a new content num."""
+        return FIRST + next(self.__nums) % _span
+
+    def next_sequence(self):
+        """a new message seq."""
+        return FIRST + next(self.__sequences) % _span
+
+
+def is_before(a, b):
+    """whether num (or seq) a was allocated before b, across wraparounds.
 
-    def get_sequence(self):
-        return self.__sequence
+    nums allocated more than half of the span apart are not comparable, they are never alive together.
+    """
+    return 0 < (b - a) % _span < _span // 2
 
 
 counter = Counter()
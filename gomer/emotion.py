@@ -5,8 +5,8 @@ from .exceptions import InvalidParameter
 
 
 class Emotion(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.emotion')
         self.group = 'emotion'
         self.expression_switch = 101
@@ -39,7 +39,7 @@ class Emotion(BaseFunction):
     def stop(self):
         content = Content(ContentCode.STOP_EMOTION.value)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def play_emotion(self, emotion):
         try:
@@ -51,19 +51,14 @@ class Emotion(BaseFunction):
                           prm3=self.motion_switch, prmstr1=emotion)
         message = SDKRequestMessage(
             content=content, block='auto', group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def is_showing(self):
         content = Content(ContentCode.GET_SHOW_STATUS.value)
         message = SDKRequestMessage(content=content, block='all')
-        result = self.sender.send(message)
-        result = result.get('prm1')
-        if result == 101:
-            return True
-        else:
-            return False
+        return self.sender.request(message, lambda result: result.get('prm1') == 101)
 
     def show_camera(self):
         content = Content(ContentCode.SHOW_CAMERA.value)
         message = SDKRequestMessage(content=content, block='never')
-        self.sender.send(message)
+        return self.sender.send(message)
@@ -20,3 +20,7 @@ class InvalidParameter(Exception):
 
 class InvalidFileType(Exception):
     pass
+
+
+class ConnectionInUse(Exception):
+    pass
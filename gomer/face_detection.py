@@ -2,18 +2,46 @@ import logging
 from gomer.base_function import BaseFunction
 from gomer.message import ContentCode, Content, SDKRequestMessage
 from gomer.exceptions import InvalidParameter
+from collections import OrderedDict
 import json
+import threading
+import numpy as np
 
 
 class FaceDetection(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.face_detection')
         self.show = True
         self.show_code = 101
         self.face_num = 0
-        self.faces = self.__get_face_list()
+        # mirror of the names in gomer's database, least recently used first, None until loaded
+        self.__faces = None
+        self.__faces_lock = threading.Lock()
         self.MAX_LEN = 10
+        # (file, file) in sorted order: similarity, of the feature files
+        self.__similarities = {}
+        # counts the feature files generated, similarities asked before are not cached
+        self.__generation = 0
+
+    @property
+    def faces(self):
+        """the mirror of gomer's database, loaded at the first use."""
+        if self.__faces is None:
+            self.load_face_list()
+        return self.__faces
+
+    def face_list_loaded(self):
+        return self.__faces is not None
+
+    def __updating(self, update):
+        """a parse function calling update(mirror) once gomer completed the request."""
+        def parse(result):
+            with self.__faces_lock:
+                if self.__faces is not None:
+                    update(self.__faces)
+            return result
+        return parse
 
     def show_face(self):
         self.show = True
@@ -40,7 +68,9 @@ class FaceDetection(BaseFunction):
         content = Content(item=ContentCode.DETECT_FACE.value, prm1=source, prm2=min_size, prm3=max_size, prm4=0,
                           prm5=self.show_code)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_faces)
+
+    def __parse_faces(self, result):
         face_list = result.get('prmstr1'), result.get('prmstr2'), result.get('prmstr3'), result.get(
             'prmstr4'), result.get('prmstr5')
         faces = [list((json.loads(x).values()))[0][:4] for x in face_list if x is not None]
@@ -61,9 +91,14 @@ class FaceDetection(BaseFunction):
 
     def get_face_feature(self, index):
         index = self.__check_index(index)
+        return self.sender.request(self.__feature_message(index), self.__parse_feature)
+
+    def __feature_message(self, index):
         content = Content(item=ContentCode.GET_FACE_FEATURE.value, prm5=self.show_code, prmstr1=index)
-        message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return SDKRequestMessage(content=content, block='all', group=None)
+
+    @staticmethod
+    def __parse_feature(result):
         result = result.get('prmstr1')
         if result:
             result = list(json.loads(result).values())[0]
@@ -72,37 +107,93 @@ class FaceDetection(BaseFunction):
 
     def get_name(self, index):
         index = self.__check_index(index)
+        return self.sender.request(self.__name_message(index), self.__parse_name)
 
+    def __name_message(self, index):
         content = Content(item=ContentCode.GET_NAME.value, prm5=self.show_code, prmstr1=index)
-        message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
-        return result.get('prmstr1')
+        return SDKRequestMessage(content=content, block='all', group=None)
+
+    def __parse_name(self, result):
+        name = result.get('prmstr1')
+        with self.__faces_lock:
+            if self.__faces is not None and name in self.__faces:
+                self.__faces.move_to_end(name)
+        return name
+
+    def identify_requests(self):
+        """(message, parse) of get_face_feature() and get_name() of every face detected last, in this order."""
+        requests = []
+        for n in range(self.face_num):
+            index = 'face{}'.format(n)
+            requests.append((self.__feature_message(index), self.__parse_feature))
+            requests.append((self.__name_message(index), self.__parse_name))
+        return requests
+
+    @staticmethod
+    def identities(faces, results, numpy=False):
+        """the result of detect_and_identify() from the faces and the parsed results of identify_requests()."""
+        landmarks, names = list(results[0::2]), list(results[1::2])
+        if numpy:
+            faces = np.array(faces, np.int32).reshape(-1, 4)
+            points = max([len(feature) for feature in landmarks if feature] + [0])
+            array = np.full((len(landmarks), points, 2), np.nan, np.float32)
+            for n, feature in enumerate(landmarks):
+                if feature:
+                    array[n, :len(feature)] = feature
+            landmarks = array
+        return dict(boxes=faces, landmarks=landmarks, names=names)
+
+    def identify(self, faces, numpy=False):
+        """get_face_feature() and get_name() of all the faces of the last detection, sent at the same time."""
+        requests = self.identify_requests()
+        with self.sender.batch() as batch:
+            for message, _ in requests:
+                self.sender.send(message)
+        results = batch.wait()
+        return self.identities(faces, [parse(result) for (_, parse), result in zip(requests, results)], numpy)
 
     # not implemented
     def get_expression(self, index):
         index = 'face{}'.format(index)
         content = Content(item=ContentCode.GET_EXPRESSION.value, prm5=self.show_code, prmstr1=index)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
-        return result.get('prm1')
+        return self.sender.request(message, lambda result: result.get('prm1'))
 
     def register_face(self, index, name):
+        index, deleted = self.plan_register(index, name)
+        if deleted is not None:
+            self.delete_face(deleted)
+        return self.send_register(index, name)
+
+    def plan_register(self, index, name):
+        """check the parameters of register_face().
+
+        :return: the index of the face on gomer and the name to delete before registering, None if none.
+        """
         index = self.__check_index(index)
         try:
             assert isinstance(name, str) and len(name) <= 10
         except AssertionError as e:
             raise InvalidParameter(
                 'Invalid parameter, please check your params, name is str and len(name) <= 10.')
-        if name in self.faces:
-            self.faces.remove(name)
-            self.delete_face(name)
-        elif len(self.faces) == self.MAX_LEN:
-            self.delete_face(self.faces[0])
-            self.faces = self.faces[1:]
-        self.faces.append(name)
+        faces = self.faces
+        if name in faces:
+            return index, name
+        if len(faces) >= self.MAX_LEN:
+            # gomer keeps MAX_LEN faces, make room by deleting the least recently used one
+            return index, next(iter(faces))
+        return index, None
+
+    def send_register(self, index, name):
+        """register the face of index on gomer as name, after plan_register() and its delete_face()."""
         content = Content(item=ContentCode.REGISTER_FACE.value, prmstr1=index, prmstr2=name)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        self.sender.send(message)
+        return self.sender.request(message, self.__updating(lambda faces: self.__register(faces, name)))
+
+    @staticmethod
+    def __register(faces, name):
+        faces[name] = None
+        faces.move_to_end(name)
 
     def set_face_feature_file(self, index, filename):
         index = self.__check_index(index)
@@ -113,14 +204,70 @@ class FaceDetection(BaseFunction):
 
         content = Content(item=ContentCode.GET_FEATURE_FILE.value, prmstr1=index, prmstr2=filename)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        self.sender.send(message)
+        self.__forget(filename)
+        return self.sender.request(message, lambda result: self.__forget(filename) or result)
+
+    def __forget(self, filename):
+        """drop the cached similarities of a feature file generated again."""
+        self.__generation += 1
+        for pair in [pair for pair in self.__similarities if filename in pair]:
+            del self.__similarities[pair]
 
     def get_similarity(self, face_file1, face_file2):
-        content = Content(item=ContentCode.GET_SIMILARITY.value, prmstr1=face_file1, prmstr2=face_file2)
-        message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
-        result = result.get('prm1')
-        return result
+        pair = tuple(sorted((face_file1, face_file2)))
+        if pair in self.__similarities:
+            return self.__similarities[pair]
+        generation = self.__generation
+        return self.sender.request(self.__similarity_message(pair),
+                                   lambda result: self.store_similarities(generation, [pair], [result])[0])
+
+    @staticmethod
+    def __similarity_message(pair):
+        content = Content(item=ContentCode.GET_SIMILARITY.value, prmstr1=pair[0], prmstr2=pair[1])
+        return SDKRequestMessage(content=content, block='all', group=None)
+
+    def similarity_requests(self, names, others=None):
+        """the generation and the (pair, message) of each pair of the matrix whose similarity is not cached.
+        a pair and its reverse are one request, a file with itself needs none.
+        """
+        others = names if others is None else others
+        pairs = {tuple(sorted((name, other))) for name in names for other in others if name != other}
+        return self.__generation, [(pair, self.__similarity_message(pair)) for pair in sorted(pairs)
+                                   if pair not in self.__similarities]
+
+    def store_similarities(self, generation, pairs, results):
+        """cache the complete messages of similarity requests, unless a feature file was generated since
+        generation. return the similarities.
+        """
+        similarities = [result.get('prm1') if result is not None else None for result in results]
+        if generation == self.__generation:
+            for pair, similarity in zip(pairs, similarities):
+                if similarity is not None:
+                    self.__similarities[pair] = similarity
+        return similarities
+
+    def cached_similarity_matrix(self, names, others=None):
+        """the matrix of the cached similarities, 100 for a file with itself, nan where none is cached."""
+        others = names if others is None else others
+        matrix = np.full((len(names), len(others)), np.nan, np.float32)
+        for row, name in enumerate(names):
+            for column, other in enumerate(others):
+                if name == other:
+                    matrix[row, column] = 100
+                else:
+                    matrix[row, column] = self.__similarities.get(tuple(sorted((name, other))), np.nan)
+        return matrix
+
+    def similarity_matrix(self, names, others=None):
+        """similarities of the feature files names with others (default names), the requests not cached
+        are sent at the same time.
+        """
+        generation, requests = self.similarity_requests(names, others)
+        with self.sender.batch() as batch:
+            for _, message in requests:
+                self.sender.send(message)
+        self.store_similarities(generation, [pair for pair, _ in requests], batch.wait())
+        return self.cached_similarity_matrix(names, others)
 
     def rename(self, name, new_name):
         try:
@@ -131,20 +278,31 @@ class FaceDetection(BaseFunction):
                 'new_name is str and len(new_name) <= 10.')
         content = Content(item=ContentCode.RENAME.value, prmstr1=name, prmstr2=new_name)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        self.sender.send(message)
+        return self.sender.request(message, self.__updating(lambda faces: self.__rename(faces, name, new_name)))
+
+    @staticmethod
+    def __rename(faces, name, new_name):
+        if name not in faces:
+            return
+        names = [new_name if face == name else face for face in faces if face != new_name]
+        faces.clear()
+        faces.update(OrderedDict.fromkeys(names))
 
-    def __get_face_list(self):
-        faces = []
+    def load_face_list(self):
+        """ask gomer for the faces in its database and replace the mirror with them."""
         content = Content(item=ContentCode.GET_FACE_LIST.value)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_face_list)
+
+    def __parse_face_list(self, result):
         result = result.get('prmstr1')
-        if result:
-            faces = list(json.loads(result).values())[0]
-        return faces
+        names = list(json.loads(result).values())[0] if result else []
+        with self.__faces_lock:
+            self.__faces = OrderedDict.fromkeys(names)
+        return names
 
     def get_face_list(self):
-        return self.faces
+        return list(self.faces)
 
     def delete_face(self, name):
         try:
@@ -152,6 +310,6 @@ class FaceDetection(BaseFunction):
         except AssertionError as e:
             raise InvalidParameter(
                 'name does not exists in Gomer! You can check names in Gomer using get_face_list() function.')
-        content = Content(item=ContentCode.DETECT_FACE.value, prmstr1=name)
+        content = Content(item=ContentCode.DELETE_FACE.value, prmstr1=name)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        self.sender.send(message)
+        return self.sender.request(message, self.__updating(lambda faces: faces.pop(name, None)))
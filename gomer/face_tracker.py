@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+# head angles gomer accepts, see Head.closed_loop_move()
+HEAD_RANGE = (-15, 65)
+
+
+class FaceTracker(object):
+    """keeps the biggest face in the middle of the view, in a thread.
+
+    every new detection runs a proportional controller: the offset of the face from the middle, as a
+    fraction of half the view, times gain times half the field of view is the angle to turn the wheels
+    by and to move the head by. offsets within dead_zone are left alone. commands are sent with
+    block='never', so a new command replaces the one gomer is still executing, and at most max_rate
+    times a second per actuator. a command computed while the actuator has to wait replaces the one
+    waiting before it, only the newest one is sent.
+    """
+
+    def __init__(self, faces, turn, head_move=None, size=(320, 180), fov=(60, 34), gain=0.5, dead_zone=0.125,
+                 max_rate=5, speed=2, head_angle=25):
+        """
+        :param faces: function(timeout) returning the faces of a new detection, None if there is none in timeout
+        :param turn: function(speed, angle, block) turning the wheels, Robot.turn
+        :param head_move: function(speed, angle, block) moving the head, Robot.head_move, None to keep the head
+        :param size: (width, height) of the coordinates of the faces
+        :param fov: (horizontal, vertical) field of view of the camera in degrees
+        :param gain: fraction of the offset corrected by a command
+        :param dead_zone: offset, as a fraction of half the view, which is not corrected
+        :param max_rate: commands per second per actuator at most
+        :param speed: speed of the commands, 1~3
+        :param head_angle: angle the head is moved to at start
+        """
+        self.logger = logging.getLogger('gomer.face_tracker')
+        self.faces = faces
+        self.actuators = {'wheel': turn}
+        if head_move is not None:
+            self.actuators['head'] = head_move
+        self.size = size
+        self.fov = fov
+        self.gain = gain
+        self.dead_zone = dead_zone
+        self.interval = 1.0 / max_rate
+        self.speed = speed
+        self.head_angle = head_angle
+        # actuator: angle of the newest command not sent yet
+        self.pending = {}
+        # actuator: time the next command may be sent
+        self.next_time = dict.fromkeys(self.actuators, 0.0)
+        self.detections = 0
+        self.lost = 0
+        self.commands = 0
+        self.superseded = 0
+        self.__running = False
+        self.__thread = None
+
+    def start(self):
+        self.__running = True
+        if 'head' in self.actuators:
+            self.pending['head'] = self.head_angle
+            self.flush()
+        self.__thread = threading.Thread(target=self.__track, name='gomer-face-tracker')
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+    def __track(self):
+        while self.__running:
+            now = time.monotonic()
+            wait = min([self.next_time[actuator] - now for actuator in self.pending] + [0.5])
+            try:
+                faces = self.faces(max(wait, 0.0))
+            except Exception:
+                self.logger.exception('fail to detect faces.')
+                time.sleep(self.interval)
+                continue
+            if faces is not None:
+                self.update(faces)
+            self.flush()
+
+    def update(self, faces):
+        """compute the commands for the faces of a new detection."""
+        self.detections += 1
+        if not faces:
+            self.lost += 1
+            return
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])[:4]
+        width, height = self.size
+        offset_x = (x + w / 2 - width / 2) / (width / 2)
+        offset_y = (y + h / 2 - height / 2) / (height / 2)
+        if abs(offset_x) > self.dead_zone:
+            angle = int(round(self.gain * offset_x * self.fov[0] / 2))
+            if angle:
+                self.command('wheel', angle)
+        if 'head' in self.actuators and abs(offset_y) > self.dead_zone:
+            # a face below the middle needs the head lower
+            angle = self.head_angle - self.gain * offset_y * self.fov[1] / 2
+            angle = int(round(min(max(angle, HEAD_RANGE[0]), HEAD_RANGE[1])))
+            if angle != self.head_angle:
+                self.command('head', angle)
+
+    def command(self, actuator, angle):
+        if actuator in self.pending:
+            self.superseded += 1
+        self.pending[actuator] = angle
+
+    def flush(self):
+        """send the pending commands whose actuator may get one now."""
+        now = time.monotonic()
+        for actuator in list(self.pending):
+            if self.next_time[actuator] > now:
+                continue
+            angle = self.pending.pop(actuator)
+            self.next_time[actuator] = now + self.interval
+            try:
+                self.actuators[actuator](self.speed, angle, block='never')
+            except Exception:
+                self.logger.exception('fail to move %s by %s.', actuator, angle)
+                continue
+            self.commands += 1
+            if actuator == 'head':
+                self.head_angle = angle
+
+    def get_stats(self):
+        return dict(detections=self.detections, lost=self.lost, commands=self.commands, superseded=self.superseded)
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+        return self.get_stats()
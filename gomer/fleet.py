@@ -0,0 +1,68 @@
+from .robot import Robot
+from .transceiver import Dispatcher
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+
+class Fleet(object):
+    """many gomers driven from one process.
+
+    the robots are connected at the same time, and the messages from all of them are dispatched
+    by one pool of threads:
+
+        with Fleet(['Gomer_a2dc6e', 'Gomer_57b1f0']) as fleet:
+            fleet['Gomer_a2dc6e'].turn(2, 90)
+            fleet.map(lambda robot: robot.tts('hello', 'hello'))
+
+    LibGlproto64.dll connects one gomer per process, more robots need the loopback backend.
+    """
+
+    def __init__(self, names, workers=4):
+        """connect the gomers named names.
+
+        :param names: list of the names of the gomers
+        :param workers: int, threads dispatching the messages from the gomers
+        """
+        self.logger = logging.getLogger('gomer.fleet')
+        self.dispatcher = Dispatcher(workers)
+        self.robots = OrderedDict()
+        with ThreadPoolExecutor(max(1, len(names))) as executor:
+            futures = [(name, executor.submit(Robot, name, self.dispatcher)) for name in names]
+        try:
+            for name, future in futures:
+                self.robots[name] = future.result()
+        except Exception:
+            # don't leave the gomers connected so far behind
+            for future in (future for _, future in futures if future.exception() is None):
+                future.result().disconnect()
+            raise
+        self.logger.info('Fleet of %s gomers connected.', len(self.robots))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getitem__(self, name):
+        return self.robots[name]
+
+    def __iter__(self):
+        return iter(self.robots.values())
+
+    def __len__(self):
+        return len(self.robots)
+
+    def map(self, fn):
+        """call fn(robot) for all the robots at the same time.
+
+        :return: list of the results, in the order of the robots.
+        """
+        with ThreadPoolExecutor(max(1, len(self.robots))) as executor:
+            return list(executor.map(fn, self.robots.values()))
+
+    def close(self):
+        """destroy the connections with all the gomers."""
+        for robot in self.robots.values():
+            robot.disconnect()
@@ -0,0 +1,177 @@
+from ctypes import memmove
+from queue import Empty
+import logging
+import threading
+import time
+import cv2 as cv
+import numpy as np
+
+_conversions = {'bgr': cv.COLOR_YUV2BGR_I420, 'rgb': cv.COLOR_YUV2RGB_I420}
+
+
+class Frame(object):
+    """an I420 frame of the video data, data is a view of its slot in the FrameRing.
+
+    the slot is written again once the ring wraps around, copy data or check is_valid()
+    after using it if the frame is kept for long.
+
+    size is (width, height) of the output and roi is (x, y, width, height) in the frame, rounded
+    to even numbers and clamped to at least 2x2 pixels inside the frame. smaller outputs are decoded from every nth pixel of the Y, U and V planes,
+    then resized to size if it is not a whole fraction of the frame.
+    """
+    __slots__ = ('seq', 'timestamp', 'width', 'height', 'data', 'slot', 'ring', 'cache')
+
+    def __init__(self, seq, timestamp, width, height, data, slot, ring):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.width = width
+        self.height = height
+        self.data = data
+        self.slot = slot
+        self.ring = ring
+        # converted images of the frame
+        self.cache = {}
+
+    def is_valid(self):
+        """whether the slot still holds this frame."""
+        return self.ring.sequences[self.slot] == self.seq
+
+    def planes(self, roi=None):
+        """Y, U and V planes of the frame (or of roi), views of the slot."""
+        width, height = self.width, self.height
+        area = width * height
+        y = self.data[:area].reshape(height, width)
+        u = self.data[area:area * 5 // 4].reshape(height // 2, width // 2)
+        v = self.data[area * 5 // 4:area * 3 // 2].reshape(height // 2, width // 2)
+        if roi is None:
+            return y, u, v
+        x0, y0, w, h = (int(value) // 2 for value in roi)
+        # at least one pixel of the U and V planes (2x2 pixels), inside the frame
+        x0 = min(max(x0, 0), width // 2 - 1)
+        y0 = min(max(y0, 0), height // 2 - 1)
+        w = min(max(w, 1), width // 2 - x0)
+        h = min(max(h, 1), height // 2 - y0)
+        return (y[y0 * 2:(y0 + h) * 2, x0 * 2:(x0 + w) * 2],
+                u[y0:y0 + h, x0:x0 + w], v[y0:y0 + h, x0:x0 + w])
+
+    def gray(self, size=None, roi=None):
+        """the Y plane, a view of the slot unless size is not a whole fraction of the frame."""
+        y = self.planes(roi)[0]
+        if size is None:
+            return y
+        step = _step(y.shape, size)
+        y = y[::step, ::step]
+        if (y.shape[1], y.shape[0]) != tuple(size):
+            y = cv.resize(y, tuple(size), interpolation=cv.INTER_AREA)
+        return y
+
+    def image(self, color='bgr', size=None, roi=None):
+        """the frame converted to 'bgr' or 'rgb', cached in the frame. the image is read-only, copy it to draw on it."""
+        key = (color, None if size is None else tuple(size), None if roi is None else tuple(roi))
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+        if roi is None and size is None:
+            i420 = self.data.reshape(self.height * 3 // 2, self.width)
+        else:
+            y, u, v = self.planes(roi)
+            # keep 2x2 pixels of Y for a pixel of U and V
+            step = 1 if size is None else max(1, min(_step(y.shape, size), min(y.shape) // 2))
+            y, u, v = y[::step, ::step], u[::step, ::step], v[::step, ::step]
+            height, width = y.shape[0] // 2 * 2, y.shape[1] // 2 * 2
+            i420 = np.concatenate((y[:height, :width].ravel(), u[:height // 2, :width // 2].ravel(),
+                                   v[:height // 2, :width // 2].ravel())).reshape(height * 3 // 2, width)
+        image = cv.cvtColor(i420, _conversions[color])
+        if size is not None and (image.shape[1], image.shape[0]) != tuple(size):
+            image = cv.resize(image, tuple(size), interpolation=cv.INTER_AREA)
+        image.flags.writeable = False
+        self.cache[key] = image
+        return image
+
+    def __repr__(self):
+        return '<Frame seq={} {}x{} at {:.3f}>'.format(self.seq, self.width, self.height, self.timestamp)
+
+
+def _step(shape, size):
+    """the biggest step of pixels keeping at least size (width, height) of shape."""
+    return max(1, min(shape[1] // max(1, size[0]), shape[0] // max(1, size[1])))
+
+
+class FrameRing(object):
+    """a fixed pool of preallocated frame slots filled from the video data callback.
+
+    put() copies a frame into the next slot with one memmove, when all slots hold unread frames
+    the oldest of them is dropped. get() returns the oldest unread frame, latest() the newest one.
+    """
+
+    def __init__(self, slots=4, width=1280, height=720):
+        self.logger = logging.getLogger('gomer.frames')
+        self.slots = slots
+        self.buffer = np.empty((slots, width * height * 3 // 2), np.uint8)
+        # seq of the frame in each slot, -1 while a slot is empty or being written
+        self.sequences = [-1] * slots
+        self.frames = [None] * slots
+        self.seq = 0
+        # seq of the oldest unread frame
+        self.next_seq = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def put(self, pointer, width, height):
+        """copy the I420 frame at pointer into the ring, called on the thread of LibGlproto."""
+        size = width * height * 3 // 2
+        with self.lock:
+            if size > self.buffer.shape[1]:
+                self.logger.info('video data is %sx%s, frame slots are reallocated.', width, height)
+                self.buffer = np.empty((self.slots, size), np.uint8)
+                self.sequences = [-1] * self.slots
+                self.frames = [None] * self.slots
+                self.next_seq = self.seq
+            seq = self.seq
+            slot = seq % self.slots
+            if self.seq - self.next_seq >= self.slots:
+                # the oldest unread frame is in the slot, drop it
+                self.next_seq += 1
+                self.dropped += 1
+            self.sequences[slot] = -1
+            data = self.buffer[slot, :size]
+        memmove(data.ctypes.data, pointer, size)
+        frame = Frame(seq, time.time(), width, height, data, slot, self)
+        with self.changed:
+            self.sequences[slot] = seq
+            self.frames[slot] = frame
+            self.seq = seq + 1
+            self.changed.notify_all()
+        return frame
+
+    def get(self, timeout=None):
+        """remove and return the oldest unread frame, raise queue.Empty after timeout seconds."""
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.next_seq < self.seq, timeout):
+                raise Empty
+            frame = self.frames[self.next_seq % self.slots]
+            self.next_seq += 1
+            return frame
+
+    def latest(self):
+        """the newest frame, None before the first one."""
+        with self.lock:
+            if self.seq == 0:
+                return None
+            return self.frames[(self.seq - 1) % self.slots]
+
+    def wait_latest(self, after=-1, timeout=None):
+        """block until there is a frame newer than seq after and return the newest frame,
+        None after timeout seconds.
+        """
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.seq - 1 > after, timeout):
+                return None
+            return self.frames[(self.seq - 1) % self.slots]
+
+    def empty(self):
+        return self.next_seq >= self.seq
+
+    def __len__(self):
+        return self.seq - self.next_seq
@@ -1,14 +1,13 @@
 from .base_function import BaseFunction
 from .counter import counter
-import json
+from . import codec
 
 
 class Hardware(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
 
     def check_version(self):
-        num = counter.generate_sequence()
-        message = dict(seq=num, msgtype=1, hard=dict(num=num, call=300))
-        message = json.dumps(message)
+        message = dict(seq=counter.next_sequence(), msgtype=1, hard=dict(num=counter.generate_sequence(), call=300))
+        message = codec.dumps(message)
         self.sender.send_original(message)
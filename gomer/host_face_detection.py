@@ -0,0 +1,177 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from .shared_frames import attach_shared_memory
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import cv2 as cv
+import numpy as np
+
+# coordinates of the faces are in the scale of gomer's face detection
+ROBOT_SIZE = (320, 180)
+
+# state of a worker process
+_worker = {}
+
+
+def haar_cascade_path():
+    """the frontal face Haar cascade shipped with cv2, None if this OpenCV has none (OpenCV 5)."""
+    if not hasattr(cv, 'CascadeClassifier') or not hasattr(cv.data, 'haarcascades'):
+        return None
+    path = os.path.join(cv.data.haarcascades, 'haarcascade_frontalface_default.xml')
+    return path if os.path.isfile(path) else None
+
+
+def _init_worker(name, shape, model):
+    cv.setNumThreads(1)
+    memory = attach_shared_memory(name)
+    _worker['memory'] = memory
+    _worker['images'] = np.ndarray(shape, np.uint8, buffer=memory.buf)
+    if model is None:
+        _worker['cascade'] = cv.CascadeClassifier(haar_cascade_path())
+    else:
+        _worker['yunet'] = cv.FaceDetectorYN.create(model, '', (shape[2], shape[1]))
+
+
+def _detect(slot, scale, min_size, max_size):
+    """faces in the image of slot, [x, y, w, h] divided by scale."""
+    image = _worker['images'][slot]
+    if 'cascade' in _worker:
+        faces = _worker['cascade'].detectMultiScale(image, 1.1, 5, minSize=(min_size, min_size),
+                                                    maxSize=(max_size, max_size))
+    else:
+        _, faces = _worker['yunet'].detect(cv.cvtColor(image, cv.COLOR_GRAY2BGR))
+        faces = [face[:4] for face in (faces if faces is not None else ()) if min_size <= face[2] <= max_size]
+    faces = sorted(faces, key=lambda face: face[2] * face[3], reverse=True)
+    return [[int(round(value / scale)) for value in face] for face in faces]
+
+
+class HostFaceDetection(object):
+    """detects faces in the video data on this computer, with OpenCV in a pool of processes.
+
+    the frontal face Haar cascade of cv2 is used, or a YuNet model (face_detection_yunet_*.onnx of the
+    OpenCV model zoo) given as model. OpenCV 5 ships no Haar cascades, it needs the model.
+
+    frames are copied as grayscale images into slots of a shared memory block, the workers read them
+    from there. start() detects faces in the new frames continuously, as many frames at the same time
+    as there are workers, frames coming while all slots are busy are dropped. faces are [x, y, w, h]
+    in 320x180, the scale of FaceDetection.detect_face().
+    """
+
+    def __init__(self, frames, workers=None, size=(640, 360), min_size=10, max_size=300, model=None):
+        """
+        :param frames: FrameRing of the video data
+        :param workers: processes detecting faces, default the number of cpus
+        :param size: (width, height) the frames are detected in
+        :param min_size: min width of the faces, in 320x180
+        :param max_size: max width of the faces, in 320x180
+        :param model: path of a YuNet onnx model, default the Haar cascade
+        """
+        self.logger = logging.getLogger('gomer.host_face_detection')
+        if model is None and haar_cascade_path() is None:
+            raise FileNotFoundError('OpenCV {} has no Haar cascades, give the path of a YuNet model '
+                                    '(face_detection_yunet_2023mar.onnx) as model.'.format(cv.__version__))
+        if model is not None and not os.path.isfile(model):
+            raise FileNotFoundError('{} not found.'.format(model))
+        self.frames = frames
+        self.workers = workers or os.cpu_count() or 1
+        self.size = tuple(size)
+        self.scale = self.size[0] / ROBOT_SIZE[0]
+        self.min_size = int(min_size * self.scale)
+        self.max_size = int(max_size * self.scale)
+        slots = self.workers + 1
+        shape = (slots, self.size[1], self.size[0])
+        self.memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self.images = np.ndarray(shape, np.uint8, buffer=self.memory.buf)
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(self.memory.name, shape, model))
+        self.detected = 0
+        self.dropped = 0
+        # (frame seq, frame timestamp, faces) of the newest frame detected
+        self.result = None
+        self.last_seq = -1
+        self.changed = threading.Condition()
+        self.__running = False
+        self.__thread = None
+
+    def submit(self, frame, block=False, timeout=None):
+        """detect faces in frame, return a Future of the faces, None if all slots stay busy."""
+        try:
+            slot = self.free.get(block, timeout)
+        except queue.Empty:
+            self.dropped += 1
+            return None
+        np.copyto(self.images[slot], frame.gray(self.size))
+        future = self.executor.submit(_detect, slot, self.scale, self.min_size, self.max_size)
+        future.add_done_callback(lambda future: self.__done(future, slot, frame))
+        return future
+
+    def __done(self, future, slot, frame):
+        self.free.put(slot)
+        if future.cancelled() or future.exception() is not None:
+            if not future.cancelled():
+                self.logger.error('fail to detect faces: %s', future.exception())
+            return
+        with self.changed:
+            self.detected += 1
+            if self.result is None or frame.seq > self.result[0]:
+                self.result = (frame.seq, frame.timestamp, future.result())
+                self.changed.notify_all()
+
+    def detect(self, frame=None, timeout=None):
+        """detect faces in frame, default the newest frame, and wait for them."""
+        frame = frame if frame is not None else self.frames.latest()
+        if frame is None:
+            return []
+        return self.submit(frame, True).result(timeout)
+
+    def start(self):
+        """detect faces in every new frame, as far as the workers keep up."""
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__feed, name='gomer-host-face-detection')
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+    def __feed(self):
+        last_seq = -1
+        while self.__running:
+            frame = self.frames.wait_latest(last_seq, 0.2)
+            if frame is None:
+                continue
+            last_seq = frame.seq
+            self.submit(frame)
+
+    def get_faces(self, wait_new=True, timeout=None):
+        """faces of the newest frame detected.
+
+        :param wait_new: wait for the faces of a frame newer than the one returned last time
+        :return: list of [x, y, w, h], None if no frame is detected (yet)
+        """
+        with self.changed:
+            if wait_new and not self.changed.wait_for(
+                    lambda: self.result is not None and self.result[0] > self.last_seq, timeout):
+                return None
+            if self.result is None:
+                return None
+            self.last_seq = self.result[0]
+            return self.result[2]
+
+    def get_stats(self):
+        return dict(workers=self.workers, detected=self.detected, dropped=self.dropped)
+
+    def stop(self):
+        """stop detecting and the worker processes, free the shared memory."""
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+        self.executor.shutdown(wait=True)
+        del self.images
+        self.memory.close()
+        self.memory.unlink()
+        return self.get_stats()
@@ -0,0 +1,285 @@
+from .message import ContentCode, MessageKey, MessageType, ResultCode
+from .timer import Timer
+from ctypes import c_ubyte
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import numpy as np
+
+
+class LoopbackGlproto(object):
+    """pure python stand-in for LibGlproto64.dll, gomer is simulated in process.
+
+    implements the Protocol* functions of docs/glproto.h with the same ctypes arguments the dll takes,
+    and calls back with the response and complete messages gomer would send for every ContentCode.
+    messages are delayed by latency +- jitter seconds and each of them is lost with drop_rate.
+    video data is a synthesized I420 stream.
+
+    select it with `backend=loopback` in the [glproto] section of config.ini, every Connection
+    then gets a LoopbackGlproto of its own.
+    """
+
+    def __init__(self, latency=0.005, jitter=0.002, drop_rate=0.0, execution_time=0.02, video_fps=25,
+                 width=1280, height=720, seed=None):
+        self.logger = logging.getLogger('gomer.loopback')
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.execution_time = execution_time
+        self.video_fps = video_fps
+        self.width = width
+        self.height = height
+        self.version = '1.34.6'
+        self.__random = random.Random(seed)
+        self.__message_callback = None
+
+        # timer thread delivering delayed callbacks
+        self.__timer = Timer('gomer-loopback')
+
+        self.__video_callback = None
+        self.__video_thread = None
+
+        # simulated database of gomer
+        self.volume = 3
+        self.faces = []
+        self.feature_files = set()
+        self.patterns = []
+
+        self.responders = {
+            ContentCode.VOLUME.value: self.__volume,
+            ContentCode.PLAY_STATUS.value: self.__idle,
+            ContentCode.INFRARED.value: self.__infrared,
+            ContentCode.GYROSCOPE.value: self.__gyroscope,
+            ContentCode.DETECT_FACE.value: self.__detect_face,
+            ContentCode.GET_FACE_FEATURE.value: self.__face_feature,
+            ContentCode.REGISTER_FACE.value: self.__register_face,
+            ContentCode.GET_NAME.value: self.__name,
+            ContentCode.GET_EXPRESSION.value: self.__expression,
+            ContentCode.GET_FEATURE_FILE.value: self.__feature_file,
+            ContentCode.GET_SIMILARITY.value: self.__similarity,
+            ContentCode.RENAME.value: self.__rename,
+            ContentCode.GET_FACE_LIST.value: self.__face_list,
+            ContentCode.DELETE_FACE.value: self.__delete_face,
+            ContentCode.DETECT_PATTERN.value: self.__detect_pattern,
+            ContentCode.ADD_PATTERN.value: self.__add_pattern,
+            ContentCode.DEL_PATTERN.value: self.__del_pattern,
+            ContentCode.RENAME_PATTERN.value: self.__rename_pattern,
+            ContentCode.GET_PATTERN_LIST.value: self.__pattern_list,
+            ContentCode.GET_PATTERN_LOCATION.value: self.__pattern_location,
+            ContentCode.MOVE_TO_PATTERN.value: self.__move_to_pattern,
+            ContentCode.GET_SHOW_STATUS.value: self.__idle,
+            ContentCode.EMOTION_STATUS.value: self.__idle,
+        }
+
+    # Protocol* functions of LibGlproto
+    def ProtocolSearchDevice(self, respond_device_number, name_list):
+        respond_device_number._obj.value = 1
+        name_list[0] = b'Gomer_loopback'
+        return 1
+
+    def ProtocolConnectDevice(self, name, msg_callback):
+        self.__message_callback = msg_callback
+        return 1
+
+    def ProtocolDestroyConnect(self):
+        self.__message_callback = None
+        self.ProtocolCloseVideo()
+        return 0
+
+    def ProtocolSendMessage(self, buf):
+        message = json.loads(getattr(buf, 'value', buf))
+        if message.get('msgtype') != MessageType.REQUEST.value:
+            # gomer does nothing with the response of its complete messages
+            return 0
+        if MessageKey.HARD.value in message:
+            self.__reply(dict(seq=message.get('seq'), msgtype=MessageType.REQUEST.value,
+                              hard=dict(num=message['hard'].get('num'), ver=self.version)))
+        elif MessageKey.SDKS.value in message:
+            self.__execute(message)
+        return 0
+
+    def ProtocolSendFileBlock(self, file_type, file_path):
+        return self.__transmit(file_path)
+
+    def ProtocolSendFileUnblock(self, file_type, file_path, cb):
+        result = self.__transmit(file_path)
+        self.__timer.call_later(self.__delay(), cb, result)
+        return 0
+
+    def ProtocolOpenVideo(self, play_video):
+        self.__video_callback = play_video
+        if self.__video_thread is None:
+            self.__video_thread = threading.Thread(target=self.__run_video)
+            self.__video_thread.daemon = True
+            self.__video_thread.start()
+        return 0
+
+    def ProtocolCloseVideo(self):
+        self.__video_callback = None
+        return 0
+
+    def ProtocolOpenVideoAndDisplay(self):
+        return 0
+
+    def ProtocolCloseVideoAndDisplay(self):
+        return 0
+
+    # messages
+    def __execute(self, message):
+        seq = message.get('seq')
+        content = message[MessageKey.SDKS.value]
+        num, item = content.get('num'), content.get('item')
+        response = dict(seq=seq, msgtype=MessageType.RESPONSE.value, code=ResultCode.SUCCESS.value,
+                        sdks=dict(num=num, item=item))
+        delay = self.__delay()
+        self.__reply(response, delay)
+
+        responder = self.responders.get(item)
+        complete = dict(num=num, item=item, result=ResultCode.SUCCESS.value)
+        if responder is not None:
+            complete.update(responder(content))
+        self.__reply(dict(seq=seq, msgtype=MessageType.REQUEST.value, sdks=complete),
+                     delay + self.execution_time + self.__delay())
+
+    def __reply(self, message, delay=None):
+        if self.__random.random() < self.drop_rate:
+            return
+        self.__timer.call_later(self.__delay() if delay is None else delay, self.__deliver, json.dumps(message).encode())
+
+    def __deliver(self, message):
+        callback = self.__message_callback
+        if callback is not None:
+            callback(message, len(message))
+
+    def __delay(self):
+        return max(0.0, self.latency + self.__random.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def __transmit(file_path):
+        path = getattr(file_path, 'value', file_path)
+        if not path:
+            return -3
+        if not os.path.exists(path.decode() if isinstance(path, bytes) else path):
+            return -2
+        return 1
+
+    # video
+    def __run_video(self):
+        size = self.width * self.height * 3 // 2
+        frame = (c_ubyte * size)()
+        yuv = np.frombuffer(frame, np.uint8)
+        y = yuv[:self.width * self.height].reshape(self.height, self.width)
+        yuv[self.width * self.height:] = 128
+        gradient = np.arange(self.width, dtype=np.uint16)
+        for index in itertools.count():
+            callback = self.__video_callback
+            if callback is None:
+                break
+            start = time.monotonic()
+            # a gradient moving to the left, with a bright square moving to the right
+            y[:] = ((gradient + index * 8) % 256).astype(np.uint8)
+            x = index * 8 % (self.width - 80)
+            y[self.height // 2 - 40:self.height // 2 + 40, x:x + 80] = 235
+            callback(frame, self.width, self.height)
+            time.sleep(max(0.0, 1.0 / self.video_fps - (time.monotonic() - start)))
+        self.__video_thread = None
+
+    # simulated results of each ContentCode
+    def __volume(self, content):
+        if content.get('prm1') == 101:
+            self.volume = content.get('prm2')
+            return {}
+        return dict(prm1=102, prm2=self.volume)
+
+    @staticmethod
+    def __idle(content):
+        return dict(prm1=100)
+
+    def __infrared(self, content):
+        return dict(prm1=content.get('prm1'), prm2=self.__random.randint(1800, 2200))
+
+    @staticmethod
+    def __gyroscope(content):
+        return dict(prm1=1 << 30, prm2=0, prm3=0, prm4=0)
+
+    @staticmethod
+    def __detect_face(content):
+        return dict(prmstr1=json.dumps(dict(face0=[140, 60, 40, 40, 99])))
+
+    @staticmethod
+    def __face_feature(content):
+        return dict(prmstr1=json.dumps({content.get('prmstr1'): [150, 72, 170, 72, 160, 82, 152, 90, 168, 90]}))
+
+    def __register_face(self, content):
+        name = content.get('prmstr2')
+        if name in self.faces:
+            self.faces.remove(name)
+        self.faces.append(name)
+        return {}
+
+    def __name(self, content):
+        return dict(prmstr1=self.faces[-1] if self.faces else '')
+
+    @staticmethod
+    def __expression(content):
+        return dict(prm1=0)
+
+    def __feature_file(self, content):
+        self.feature_files.add(content.get('prmstr2'))
+        return {}
+
+    @staticmethod
+    def __similarity(content):
+        name1, name2 = content.get('prmstr1'), content.get('prmstr2')
+        if name1 == name2:
+            return dict(prm1=100)
+        return dict(prm1=sum(map(ord, '{}{}'.format(*sorted((name1, name2))))) % 100)
+
+    def __rename(self, content):
+        name, new_name = content.get('prmstr1'), content.get('prmstr2')
+        if name in self.faces:
+            self.faces[self.faces.index(name)] = new_name
+        return {}
+
+    def __face_list(self, content):
+        return dict(prmstr1=json.dumps(dict(faces=self.faces)))
+
+    def __delete_face(self, content):
+        if content.get('prmstr1') in self.faces:
+            self.faces.remove(content.get('prmstr1'))
+        return {}
+
+    @staticmethod
+    def __detect_pattern(content):
+        return dict(prmstr1=json.dumps(dict(pattern0=[120, 50, 120, 130, 200, 130, 200, 50])))
+
+    def __add_pattern(self, content):
+        self.patterns.append(content.get('prmstr1'))
+        return {}
+
+    def __del_pattern(self, content):
+        if content.get('prmstr1') in self.patterns:
+            self.patterns.remove(content.get('prmstr1'))
+        return {}
+
+    def __rename_pattern(self, content):
+        name, new_name = content.get('prmstr1'), content.get('prmstr2')
+        if name in self.patterns:
+            self.patterns[self.patterns.index(name)] = new_name
+        return {}
+
+    def __pattern_list(self, content):
+        return dict(prmstr1=json.dumps(dict(patterns=self.patterns)))
+
+    @staticmethod
+    def __pattern_location(content):
+        return dict(prmstr1=json.dumps({content.get('prmstr1'): [0.0, 0.0, 300.0, 0.0, 0.0, 0.0]}))
+
+    @staticmethod
+    def __move_to_pattern(content):
+        # 101: gomer is already at the pattern
+        return dict(prm1=101)
@@ -1,10 +1,19 @@
-from gomer.counter import counter
+from gomer.counter import counter, is_before
+from gomer import codec
 import abc
 import enum
-import json
 import logging
+import threading
+from concurrent.futures import Future
+try:
+    from concurrent.futures import InvalidStateError
+except ImportError:
+    # python < 3.8
+    InvalidStateError = RuntimeError
 from gomer.exceptions import MessageNotRespond, MessageExecuteFail
 
+logger = logging.getLogger('gomer.message')
+
 
 class ContentCode(enum.Enum):
     MOVE = 1101  # open-loop control
@@ -58,9 +67,10 @@ class ContentCode(enum.Enum):
 
 
 class Message(metaclass=abc.ABCMeta):
+    # messages are created for every request, response and complete message, keep them small
+    __slots__ = ('sequence', 'content', 'key', 'message_type', 'code', 'responsed', 'interrupted', 'completed')
 
     def __init__(self, content, sequence=None):
-        self.logger = logging.getLogger('gomer.message')
         self.sequence = sequence
         self.content = content
         self.key = None
@@ -72,11 +82,11 @@ class Message(metaclass=abc.ABCMeta):
         self.completed = False
 
     def __str__(self):
-        if self.code:
-            message = {"seq": self.sequence, "msgtype": self.message_type, "code": self.code}
-        else:
-            message = {"seq": self.sequence, "msgtype": self.message_type, self.key: self.content.to_dict()}
-        return json.dumps(message)
+        return self.encode().decode()
+
+    def encode(self):
+        """bytes sent to gomer"""
+        return codec.encode(self)
 
     def is_response(self):
         if self.message_type == MessageType.RESPONSE.value:
@@ -84,7 +94,7 @@ class Message(metaclass=abc.ABCMeta):
         return False
 
     def is_interrupted(self, message):
-        if message.sequence > self.sequence:
+        if is_before(self.sequence, message.sequence):
             self.interrupted = True
         return self.interrupted
 
@@ -94,8 +104,9 @@ class Message(metaclass=abc.ABCMeta):
         return False
 
     @classmethod
-    def from_dict(cls, message):
-        key = (message.keys() & MessageKey._value2member_map_.keys()).pop()
+    def from_dict(cls, message, key=None):
+        if key is None:
+            key = next(k for k in message if k in _message_keys)
         _cls = cls(content=Content.from_dict(message[key]), sequence=message.get('seq'))
         _cls.key = key
         _cls.message_type = message.get('msgtype')
@@ -103,6 +114,88 @@ class Message(metaclass=abc.ABCMeta):
         return _cls
 
 
+class Completion(Future):
+    """Future-like handle of a sdk request.
+
+    The handler marks it responded when gomer accepts the request and resolves it with
+    the content of the complete message (a dict) when gomer finishes executing it.
+    An interrupted request resolves with None.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._responded = threading.Event()
+        self._response_lock = threading.Lock()
+        self._response_callbacks = []
+        # set by the first of the handler, a deadline or an interrupt to resolve the completion
+        self._resolving = False
+
+    def responded(self):
+        return self._responded.is_set()
+
+    def wait_response(self, timeout=None):
+        """block until gomer responds the request or the request is resolved."""
+        return self._responded.wait(timeout)
+
+    def add_response_callback(self, fn):
+        """call fn(completion) once gomer responds the request or the request is resolved."""
+        with self._response_lock:
+            if not self._responded.is_set():
+                self._response_callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_responded(self):
+        with self._response_lock:
+            if self._responded.is_set():
+                return
+            self._responded.set()
+            callbacks, self._response_callbacks = self._response_callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def set_result(self, result):
+        super().set_result(result)
+        self.set_responded()
+
+    def set_exception(self, exception):
+        super().set_exception(exception)
+        self.set_responded()
+
+    def __claim(self):
+        """whether the caller is the first to resolve the completion."""
+        with self._response_lock:
+            if self._resolving or self.done():
+                return False
+            self._resolving = True
+            return True
+
+    def set_result_if_pending(self, result):
+        """set_result unless the completion is resolved already, return whether it was set.
+        the done callbacks run outside of any lock, like with set_result.
+        """
+        if not self.__claim():
+            return False
+        try:
+            super().set_result(result)
+        except InvalidStateError:
+            # cancelled meanwhile
+            return False
+        self.set_responded()
+        return True
+
+    def set_exception_if_pending(self, exception):
+        """set_exception unless the completion is resolved already, return whether it was set."""
+        if not self.__claim():
+            return False
+        try:
+            super().set_exception(exception)
+        except InvalidStateError:
+            return False
+        self.set_responded()
+        return True
+
+
 class BlockStatus(enum.Enum):
     NEVER = 'never'
     AUTO = 'auto'
@@ -125,60 +218,104 @@ class MessageKey(enum.Enum):
     SDKS = 'sdks'  # for Python SDK
 
 
+_message_keys = frozenset(key.value for key in MessageKey)
+
+# field of the content holding the timeout in milliseconds, for instructions which have one
+timeout_fields = {code.value: 'prm3' for code in (
+    ContentCode.MOVE, ContentCode.MOVE_DIRECTLY, ContentCode.TURN,
+    ContentCode.FOREARM_OPEN, ContentCode.FOREARM_CLOSE, ContentCode.ARM_OPEN, ContentCode.ARM_CLOSE,
+    ContentCode.HEAD_OPEN, ContentCode.HEAD_CLOSE, ContentCode.PAW_OPEN, ContentCode.PAW_CLOSE)}
+
+# instructions running as long as their content
+open_ended_codes = frozenset(code.value for code in (
+    ContentCode.TTS, ContentCode.PLAY_NOTES, ContentCode.PLAY_FILE, ContentCode.PLAY_EMOTION,
+    ContentCode.PLAY_CUSTOM_EMOTION))
+
+
 class ResultCode(enum.Enum):
     SUCCESS = 100
     FAIL = 101
 
 
 class RequestMessage(Message):
+    __slots__ = ()
+
     def __init__(self, content, sequence=None):
         super().__init__(content, sequence)
         self.message_type = MessageType.REQUEST.value
 
 
 class ResponseMessage(Message):
+    __slots__ = ()
+
     def __init__(self, content, sequence=None):
         super().__init__(content, sequence)
         self.message_type = MessageType.RESPONSE.value
 
 
 class SDKRequestMessage(RequestMessage):
+    __slots__ = ('group', 'block', 'complete_message', 'completion')
+
     def __init__(self, content, block, sequence=None, group=None):
         super().__init__(content, sequence)
         self.key = MessageKey.SDKS.value
-        self.sequence = counter.get_sequence()
+        if sequence is None:
+            self.sequence = counter.next_sequence()
         self.group = group
         self.block = block
         self.complete_message = None
+        self.completion = Completion()
 
     def check_response(self, message):
         if self.content.num == message.content.num:
             if message.code == ResultCode.SUCCESS.value:
                 self.responsed = True
+                self.completion.set_responded()
             else:
-                self.logger.error('Message not respond.')
-                raise MessageNotRespond('Message not respond.')
+                logger.error('Message not respond.')
+                self.completion.set_exception_if_pending(MessageNotRespond('Message not respond.'))
         return self.responsed
 
     def check_complete(self, message):
         if self.content.num == message.content.num:
+            self.completed = True
+            self.complete_message = message
             if message.content.result == ResultCode.SUCCESS.value:
-                self.completed = True
-                self.complete_message = message
+                self.completion.set_result_if_pending(message.content.to_dict())
             else:
-                self.logger.error('Message execute fail.')
-                raise MessageExecuteFail(
-                    'Message execute fail.message is {},complete message is: {}'.format(self, message))
+                logger.error('Message execute fail.')
+                self.completion.set_exception_if_pending(MessageExecuteFail(
+                    'Message execute fail.message is {},complete message is: {}'.format(self, message)))
         return self.completed
 
+    def interrupt(self):
+        self.interrupted = True
+        self.completion.set_result_if_pending(None)
+
+    def get_timeout(self):
+        """seconds gomer may take by the timeout parameter of the instruction, None if it has none."""
+        field = timeout_fields.get(self.content.item)
+        if field is None:
+            return None
+        timeout = getattr(self.content, field)
+        return timeout / 1000 if timeout else None
+
+    def is_open_ended(self):
+        """whether the instruction runs as long as its content, e.g. tts."""
+        return self.content.item in open_ended_codes
+
 
 class SDKResponseMessage(RequestMessage):
+    __slots__ = ()
+
     def __init__(self, content, sequence=None):
         super().__init__(content, sequence)
         self.key = MessageKey.SDKS.value
 
 
 class Content(object):
+    __slots__ = codec.CONTENT_FIELDS
+
     def __init__(self, item, num=None, prm1=None, prm2=None, prm3=None, prm4=None, prm5=None, prmstr1=None,
                  prmstr2=None, prmstr3=None, prmstr4=None, prmstr5=None, result=None):
         self.num = num if num else counter.generate_sequence()
@@ -196,15 +333,14 @@ class Content(object):
         self.result = result
 
     def to_dict(self):
-        content = {}
-        for k, v in self.__dict__.items():
-            if v is not None:
-                content[k] = v
-        return content
+        return codec.content_to_dict(self)
 
     @classmethod
     def from_dict(cls, content):
-        return cls(item=content.get('item'), num=content.get('num'), prm1=content.get('prm1'), prm2=content.get('prm2'),
-                   prm3=content.get('prm3'), prm4=content.get('prm4'), prm5=content.get('prm5'),
-                   prmstr1=content.get('prmstr1'), prmstr2=content.get('prmstr2'), prmstr3=content.get('prmstr3'),
-                   prmstr4=content.get('prmstr4'), prmstr5=content.get('prmstr5'), result=content.get('result'))
+        try:
+            return cls(**content)
+        except TypeError:
+            # fields unknown to the SDK or no item
+            fields = {k: v for k, v in content.items() if k in codec.CONTENT_FIELD_SET}
+            fields.setdefault('item', None)
+            return cls(**fields)
@@ -4,14 +4,14 @@ import logging
 
 
 class Motion(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.motion')
 
 
 class Wheel(Motion):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.wheel')
         self.group = 'wheel'
 
@@ -36,7 +36,7 @@ class Wheel(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def move_directly(self, speed, distance, timeout, block):
         try:
@@ -53,7 +53,7 @@ class Wheel(Motion):
                           prm1=speed, prm2=distance, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def turn(self, speed, angle, timeout, block):
         try:
@@ -70,12 +70,12 @@ class Wheel(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
 
 class Forearm(Motion):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.forearm')
 
         self.group = 'forearm'
@@ -93,7 +93,7 @@ class Forearm(Motion):
                           prm1=speed, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def closed_loop_move(self, speed, angle, timeout, block):
         try:
@@ -109,12 +109,12 @@ class Forearm(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
 
 class Arm(Motion):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.arm')
 
         self.group = 'arm'
@@ -132,7 +132,7 @@ class Arm(Motion):
                           prm1=speed, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def closed_loop_move(self, speed, angle, timeout, block):
         try:
@@ -148,12 +148,12 @@ class Arm(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
 
 class Head(Motion):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.head')
         self.group = 'head'
 
@@ -170,7 +170,7 @@ class Head(Motion):
                           prm1=speed, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def closed_loop_move(self, speed, angle, timeout, block):
         try:
@@ -186,12 +186,12 @@ class Head(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
 
 class Paw(Motion):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.paw')
 
         self.group = 'paw'
@@ -209,7 +209,7 @@ class Paw(Motion):
                           prm1=speed, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def closed_loop_move(self, speed, angle, timeout, block):
         try:
@@ -225,4 +225,4 @@ class Paw(Motion):
                           prm1=speed, prm2=angle, prm3=timeout)
         message = SDKRequestMessage(
             content=content, block=block, group=self.group)
-        self.sender.send(message)
+        return self.sender.send(message)
@@ -7,8 +7,8 @@ import re
 
 
 class PatternDetection(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.patter_detection')
         self.show = True
         self.show_code = 101
@@ -53,7 +53,9 @@ class PatternDetection(BaseFunction):
         content = Content(item=ContentCode.DETECT_PATTERN.value, prm1=source, prm2=min_size, prm3=max_size, prm4=0,
                           prm5=self.show_code, prmstr2=group)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_patterns)
+
+    def __parse_patterns(self, result):
         pattern_list = result.get('prmstr1'), result.get('prmstr2'), result.get('prmstr3'), result.get(
             'prmstr4'), result.get('prmstr5')
         print(pattern_list)
@@ -77,12 +79,15 @@ class PatternDetection(BaseFunction):
 
         content = Content(item=ContentCode.ADD_PATTERN.value, prmstr1=pattern_name)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def get_custom_patterns(self):
         content = Content(item=ContentCode.GET_PATTERN_LIST.value)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_pattern_list)
+
+    @staticmethod
+    def __parse_pattern_list(result):
         result = result.get('prmstr1')
         if result:
             return json.loads(result).values()
@@ -92,7 +97,10 @@ class PatternDetection(BaseFunction):
         index = self.__check_index(index)
         content = Content(item=ContentCode.GET_PATTERN_LOCATION.value, prm5=self.show_code, prmstr1=index)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_location)
+
+    @staticmethod
+    def __parse_location(result):
         result = result.get('prmstr1')
         if result:
             return list(json.loads(result).values())[0]
@@ -101,7 +109,10 @@ class PatternDetection(BaseFunction):
     def move_to_pattern(self, pattern, distance):
         content = Content(item=ContentCode.MOVE_TO_PATTERN.value, prm1=distance, prmstr1=pattern)
         message = SDKRequestMessage(content=content, block='all', group=None)
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_movement)
+
+    @staticmethod
+    def __parse_movement(result):
         if result.get('prm1') == 101:
             return None
         else:
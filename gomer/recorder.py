@@ -0,0 +1,134 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import cv2 as cv
+import numpy as np
+
+# fourcc of the video file by its extension
+_fourccs = {'.avi': 'MJPG', '.mp4': 'mp4v', '.mkv': 'XVID'}
+
+
+def _encode(frames, path, fourcc, fps, size, written):
+    """encoder process: write the I420 frames of the queue to path until None.
+
+    every frame comes with the index of the frame of the file it falls on, it is written again
+    until the file reaches that index, so the file plays at fps whatever the rate of the video.
+    """
+    writer = None
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        data, width, height, index = item
+        if index < written.value:
+            continue
+        image = cv.cvtColor(np.frombuffer(data, np.uint8).reshape(height * 3 // 2, width), cv.COLOR_YUV2BGR_I420)
+        if writer is None:
+            size = size or (width, height)
+            writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*fourcc), fps, size)
+        if (image.shape[1], image.shape[0]) != size:
+            image = cv.resize(image, size, interpolation=cv.INTER_AREA)
+        while written.value <= index:
+            writer.write(image)
+            written.value += 1
+    if writer is not None:
+        writer.release()
+
+
+class Recorder(object):
+    """records the video data to a file.
+
+    a thread takes the new frames of the FrameRing and puts them on a bounded queue, a process
+    converts and encodes them with cv.VideoWriter. when the queue is full, or frames come faster
+    than the thread takes them, frames are dropped and counted, the video data callback never waits.
+    the file plays in real time: by their timestamps, frames coming faster than fps are left out
+    and the frame before a gap is written again to fill it.
+    """
+
+    def __init__(self, frames, path, fps=25, size=None, fourcc=None, queue_size=16):
+        """
+        :param frames: FrameRing of the video data
+        :param path: file of the video, .avi, .mp4 or .mkv
+        :param fps: frames per second of the file, the video data is resampled to it
+        :param size: (width, height) of the file, default the size of the video data
+        :param fourcc: codec of the file, default by the extension of path
+        :param queue_size: frames waiting for the encoder before frames are dropped
+        """
+        self.logger = logging.getLogger('gomer.recorder')
+        self.frames = frames
+        self.path = path
+        self.fps = fps
+        self.size = tuple(size) if size is not None else None
+        self.fourcc = fourcc or _fourccs.get(os.path.splitext(path)[1].lower(), 'MJPG')
+        self.dropped = 0
+        self.__recording = False
+        context = multiprocessing.get_context('spawn')
+        self.__queue = context.Queue(queue_size)
+        self.__written = context.Value('l', 0)
+        self.__process = context.Process(target=_encode, name='gomer-recorder', args=(
+            self.__queue, path, self.fourcc, fps, self.size, self.__written))
+        self.__process.daemon = True
+        self.__thread = None
+
+    def start(self):
+        self.__process.start()
+        self.__recording = True
+        self.__thread = threading.Thread(target=self.__feed, name='gomer-recorder-feed')
+        self.__thread.daemon = True
+        self.__thread.start()
+        self.logger.info('start recording to %s', self.path)
+        return self
+
+    def __feed(self):
+        latest = self.frames.latest()
+        last_seq = latest.seq if latest is not None else -1
+        # timestamp of the first frame of the file and the index of the frame of the file queued last
+        start = None
+        last_index = -1
+        while self.__recording:
+            frame = self.frames.wait_latest(last_seq, 0.2)
+            if frame is None:
+                continue
+            if last_seq >= 0:
+                # frames the thread didn't see at all
+                self.dropped += frame.seq - last_seq - 1
+            last_seq = frame.seq
+            if start is None:
+                start = frame.timestamp
+            index = int(round((frame.timestamp - start) * self.fps))
+            if index <= last_index:
+                # within the frame of the file queued last
+                continue
+            data = frame.data.tobytes()
+            if not frame.is_valid():
+                self.dropped += 1
+                continue
+            try:
+                self.__queue.put_nowait((data, frame.width, frame.height, index))
+                last_index = index
+            except queue.Full:
+                self.dropped += 1
+
+    def stop(self, timeout=10):
+        """stop recording, wait for the encoder to write the frames queued so far.
+
+        :return: dict of the frames written to the file, dropped and the path of the file.
+        """
+        if self.__recording:
+            self.__recording = False
+            self.__thread.join()
+            self.__queue.put(None, timeout=timeout)
+            self.__process.join(timeout)
+            if self.__process.is_alive():
+                self.logger.error('the encoder did not finish in %s seconds.', timeout)
+                self.__process.terminate()
+            self.logger.info('stop recording to %s', self.path)
+        return self.get_stats()
+
+    def is_recording(self):
+        return self.__recording
+
+    def get_stats(self):
+        return dict(path=self.path, written=self.__written.value, dropped=self.dropped)
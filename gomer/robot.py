@@ -14,46 +14,101 @@ import logging
 
 
 class Robot(object):
-    def __init__(self, name):
+    def __init__(self, name, dispatcher=None):
+        """connect the gomer named name.
+
+        :param dispatcher: Dispatcher handling the messages from gomer, a thread of its own if None.
+        """
         self.__name = name
         self._logger = logging.getLogger('gomer.robot')
-        self.__handler = Handler()
-        self.__start_handler()
         self._connection = Connection()
-        self._hardware = Hardware()
+        self._sender = MessageSender(self._connection)
+        self.__handler = Handler(self._sender)
+        if dispatcher is None:
+            self.__start_handler()
+        else:
+            self._connection.set_receiver(dispatcher.receiver(self.__handler))
+        self._hardware = Hardware(self._sender)
+        # set before connecting, disconnect() in __del__ uses them when connecting fails
+        self._video = Video(self._sender)
+        self._host_face_detection = None
+        self._frame_publisher = None
+        self._face_tracker = None
 
         self.__connect()
-        self._wheel = Wheel()
-        self._forearm = Forearm()
-        self._arm = Arm()
-        self._head = Head()
-        self._paw = Paw()
-
-        self._player = Player()
-        self._screen = Screen()
-        self._sensor = Sensor()
-        self._uploader = Uploader()
-
-        self._emotion = Emotion()
-        self._face_detection = FaceDetection()
-        self._video = Video()
-        self._pattern_detection = PatternDetection()
+        self._wheel = Wheel(self._sender)
+        self._forearm = Forearm(self._sender)
+        self._arm = Arm(self._sender)
+        self._head = Head(self._sender)
+        self._paw = Paw(self._sender)
+
+        self._player = Player(self._sender)
+        self._screen = Screen(self._sender)
+        self._sensor = Sensor(self._sender)
+        self._uploader = Uploader(self._sender)
+
+        self._emotion = Emotion(self._sender)
+        self._face_detection = FaceDetection(self._sender)
+        self._pattern_detection = PatternDetection(self._sender)
+        self._scene_gate = None
 
     def __del__(self):
-        self._connection.destroy()
+        self.disconnect()
         time.sleep(2)
 
+    @property
+    def name(self):
+        return self.__name
+
+    def disconnect(self):
+        """destroy connection with gomer."""
+        self.stop_face_tracking()
+        self.stop_host_face_detection()
+        self.stop_recording()
+        self.stop_publishing_frames()
+        self._connection.destroy()
+
     def __start_handler(self):
         """start a thread for handling messages from gomer."""
         handle_thread = threading.Thread(target=self.__handler.handle,
-                                         args=(Connection.message_queue,))
+                                         args=(self._connection.message_queue,))
         handle_thread.setDaemon(True)
         handle_thread.start()
 
+    def get_handler_stats(self):
+        """get counters of the thread handling messages from gomer.
+
+        :rtype: dict
+        :return: messages and batches dispatched, the biggest batch, dispatch time in seconds
+                 (total and max per batch) and the current queue depth.
+        """
+        return self.__handler.get_stats()
+
+    def batch(self):
+        """send instructions back-to-back and wait for all of them at the end of the with block.
+        instructions in different groups (wheel, head, arm, player, screen...) run at the same time.
+
+            with robot.batch():
+                robot.turn(2, 90)
+                robot.head_move(2, 30)
+                robot.arm_move(2, 90)
+
+        instructions returning a result (e.g. read_infrared()) still wait for their own result.
+
+        :return: context manager, entering it gives a Batch, Batch.completions are the handles of
+                 the instructions sent in the block.
+        """
+        return self._sender.batch()
+
     def __connect(self):
         """connect gomer."""
         self._connection.connect(self.__name)
         self._hardware.check_version()
+        try:
+            self.__handler.wait_version()
+        except GomerNeedsUpdate:
+            self._connection.destroy()
+            raise
 
     # Sensors (including gyroscope, infrared, cliff_detection) and Lights
     def set_light_color(self, r=255, g=255, b=255):
@@ -132,8 +187,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._wheel.move(speed, timeout, block=block)
+        return self._wheel.move(speed, timeout, block=block)
 
     def straight_move(self, speed, distance, timeout=3000, block='auto'):
         """Gomer will move straight foward or backward, depends on the sign of distance.
@@ -148,8 +205,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._wheel.move_directly(
+        return self._wheel.move_directly(
             speed, distance, timeout=timeout, block=block)
 
     def turn(self, speed, angle, timeout=3000, block='auto'):
@@ -165,8 +224,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._wheel.turn(speed, angle, timeout=timeout, block=block)
+        return self._wheel.turn(speed, angle, timeout=timeout, block=block)
 
     def forearm_move_in_open_loop(self, speed, timeout=3000, block='auto'):
         """open-loop control for forearm. not accurate.
@@ -180,8 +241,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._forearm.open_loop_move(speed, timeout, block)
+        return self._forearm.open_loop_move(speed, timeout, block)
 
     def forearm_move(self, speed, angle, timeout=3000, block='auto'):
         """closed-loop control for forearm.
@@ -196,8 +259,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._forearm.closed_loop_move(
+        return self._forearm.closed_loop_move(
             speed, angle, timeout=timeout, block=block)
 
     def arm_move_in_open_loop(self, speed, timeout=3000, block='auto'):
@@ -212,8 +277,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._arm.open_loop_move(speed, timeout, block)
+        return self._arm.open_loop_move(speed, timeout, block)
 
     def arm_move(self, speed, angle, timeout=3000, block='auto'):
         """closed-loop control for arm.
@@ -228,8 +295,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._arm.closed_loop_move(speed, angle, timeout=timeout, block=block)
+        return self._arm.closed_loop_move(speed, angle, timeout=timeout, block=block)
 
     def head_move_in_open_loop(self, speed, timeout=3000, block='auto'):
         """open-loop control for arm. not accurate.
@@ -243,8 +312,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._head.open_loop_move(speed, timeout=timeout, block=block)
+        return self._head.open_loop_move(speed, timeout=timeout, block=block)
 
     def head_move(self, speed, angle, timeout=3000, block='auto'):
         """closed-loop control for arm.
@@ -259,8 +330,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._head.closed_loop_move(speed, angle, timeout=timeout, block=block)
+        return self._head.closed_loop_move(speed, angle, timeout=timeout, block=block)
 
     def paw_move_in_open_loop(self, speed, timeout=3000, block='auto'):
         """open-loop control for arm. not accurate.
@@ -274,8 +347,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._paw.open_loop_move(speed, timeout, block)
+        return self._paw.open_loop_move(speed, timeout, block)
 
     def paw_move(self, speed, angle, timeout=3000, block='auto'):
         """closed-loop control for arm.
@@ -290,8 +365,10 @@ class Robot(object):
                     never: when a new function about wheel is called after this instruction.  if this instruction
                             is not over, gomer will execute the new function.
                     all: all function callings after this instruction will be waiting until this instruction is over.
+        :rtype: Completion
+        :return: handle of the instruction, you can poll it with done(), wait with result() or add_done_callback().
         """
-        self._paw.closed_loop_move(speed, angle, timeout=timeout, block=block)
+        return self._paw.closed_loop_move(speed, angle, timeout=timeout, block=block)
 
     # player module
     def tts(self, string, filename):
@@ -462,8 +539,84 @@ class Robot(object):
                  four ints in face stands for [x, y, w, h]. x, y is the coordinate
                  of the left-top point of face, w is width, h is height.
         """
+        if self._scene_gate is not None:
+            return self._scene_gate.call('face', (min_size, max_size), self._face_detection.detect_face)
         return self._face_detection.detect_face(min_size, max_size)
 
+    def enable_scene_gate(self, threshold=0.005, pixel_threshold=20, max_age=None):
+        """skip detect_face() and detect_pattern() while the view of the camera doesn't change,
+        the previous result is returned then. video data is opened if it is not open yet.
+
+        :param threshold: float, fraction of the pixels which must change for a new detection, default 0.005
+        :param pixel_threshold: int, difference of gray levels from which a pixel has changed, default 20
+        :param max_age: seconds a previous result is returned at most, default as long as the view is static
+        """
+        from .scene_gate import SceneGate
+        if not self._video.open:
+            self.open_video_data()
+        self._scene_gate = SceneGate(self._connection.frames, threshold, pixel_threshold, max_age=max_age)
+
+    def get_scene_gate_stats(self):
+        """
+        :rtype: dict
+        :return: hits (detections skipped), misses, hit_rate and the last change score, None if
+                 enable_scene_gate() was not called.
+        """
+        if self._scene_gate is None:
+            return None
+        return self._scene_gate.get_stats()
+
+    def disable_scene_gate(self):
+        """detect on gomer at every call again.
+
+        :return: the stats of get_scene_gate_stats()
+        """
+        stats = self.get_scene_gate_stats()
+        self._scene_gate = None
+        return stats
+
+    def start_host_face_detection(self, workers=None, min_size=10, max_size=300, model=None):
+        """detect faces in the video data on this computer instead of on gomer, in a pool of processes.
+        video data is opened if it is not open yet. needs python 3.8 or later.
+
+        :param workers: int, processes detecting faces, default the number of cpus
+        :param min_size: int, min width of the faces in 320x180, default 10
+        :param max_size: int, max width of the faces in 320x180, default 300
+        :param model: path of a YuNet onnx model of the OpenCV model zoo, default the Haar cascade of
+                      OpenCV, which OpenCV 5 doesn't ship.
+        """
+        from .host_face_detection import HostFaceDetection
+        self.stop_host_face_detection()
+        if not self._video.open:
+            self.open_video_data()
+        self._host_face_detection = HostFaceDetection(self._connection.frames, workers, min_size=min_size,
+                                                      max_size=max_size, model=model).start()
+
+    def detect_face_on_host(self, wait_new=True, timeout=None):
+        """faces in the newest frame detected by start_host_face_detection().
+
+        :param wait_new: if True, wait for the faces of a frame newer than the one returned last time.
+        :param timeout: seconds to wait, None for no limit.
+        :rtype: list[list]
+        :return: list of faces like detect_face(), [x, y, w, h] in 320x180, biggest first.
+                 None if no frame is detected (yet).
+        """
+        if self._host_face_detection is None:
+            return None
+        return self._host_face_detection.get_faces(wait_new, timeout)
+
+    def stop_host_face_detection(self):
+        """stop the detection of start_host_face_detection().
+
+        :rtype: dict
+        :return: workers, frames detected and frames dropped. None if not detecting.
+        """
+        if self._host_face_detection is None:
+            return None
+        stats = self._host_face_detection.stop()
+        self._host_face_detection = None
+        return stats
+
     def get_face_feature(self, index):
         """ get face feature point, before get face feature, you should use detect_face() method
 
@@ -472,6 +625,22 @@ class Robot(object):
         """
         return self._face_detection.get_face_feature(index)
 
+    def detect_and_identify(self, min_size=10, max_size=300, numpy=False):
+        """detect faces and get the feature points and the name of each of them. the requests for the
+        feature points and names of all the faces are sent at the same time after the detection, two
+        round trips instead of one per request.
+
+        :param min_size: int 10 <= min_size <= 300, default 10, see detect_face()
+        :param max_size: int 10 <= max_size <= 300, default 300, see detect_face()
+        :param numpy: bool, boxes and landmarks as numpy arrays, default False
+        :rtype: dict
+        :return: boxes: list of faces [x, y, w, h] like detect_face(), int32 array of shape (n, 4) if numpy
+                 landmarks: feature points of each face like get_face_feature(), float32 array of shape
+                            (n, 5, 2) if numpy, nan where gomer returned none
+                 names: name of each face like get_name()
+        """
+        return self._face_detection.identify(self.detect_face(min_size, max_size), numpy)
+
     def register_face(self, index, name):
         """register face to database, before get face feature, you should use detect_face() method
 
@@ -487,7 +656,7 @@ class Robot(object):
         :param index: int 0 <= index <= len(faces) -1
         :return: str name of the face
         """
-        self._face_detection.get_name(index)
+        return self._face_detection.get_name(index)
 
     def generate_face_feature_file(self, index, filename):
         """store a face feature file in Gomer, before generate file, you should use detect_face() method
@@ -508,6 +677,21 @@ class Robot(object):
         """
         return self._face_detection.get_similarity(name1, name2)
 
+    def similarity_matrix(self, names, others=None):
+        """calc the similarity of every face feature file of names with every one of others. the
+        similarities are cached until a file is generated again by generate_face_feature_file(), the
+        ones not cached are asked for at the same time, a pair and its reverse only once.
+
+            # compare new faces with the whole roster
+            matrix = robot.similarity_matrix(['new1', 'new2'], roster)
+
+        :param names: list of face feature filenames, generated by generate_face_feature_file()
+        :param others: list of face feature filenames, default names
+        :rtype: numpy.ndarray
+        :return: float32 array of shape (len(names), len(others)), similarity 0~100, 100 for a file with itself
+        """
+        return self._face_detection.similarity_matrix(names, others)
+
     def rename(self, old_name, new_name):
         """rename a face, you should use detect_face() method or you can get_face_list() to see the
         faces in Gomer database.
@@ -524,6 +708,20 @@ class Robot(object):
         """
         return self._face_detection.get_face_list()
 
+    def sync_face_list(self):
+        """get the faces in Gomer database from gomer again, in case they were changed by another program.
+
+        :return: list[str]
+        """
+        return self._face_detection.load_face_list()
+
+    def delete_face(self, name):
+        """delete a face from Gomer database.
+
+        :param name: str, a name of get_face_list()
+        """
+        self._face_detection.delete_face(name)
+
     def turn_to_face(self):
         """When gomer detect only 1 face, he can turn to the face."""
         width = 320
@@ -544,6 +742,39 @@ class Robot(object):
         else:
             print('can not see the face.')
 
+    def start_face_tracking(self, gain=0.5, max_rate=5, head=True, fov=(60, 34)):
+        """keep turning to the biggest face in a thread, with the wheels and the head.
+        faces are taken from start_host_face_detection() if it is running, which follows the video
+        data, else detect_face() is called in a loop. commands are sent at most max_rate times a
+        second, a new command replaces the one gomer is executing.
+
+        :param gain: float, fraction of the offset of the face corrected by a command, default 0.5
+        :param max_rate: commands per second at most, of the wheels and of the head each, default 5
+        :param head: bool, move the head up and down too, default True
+        :param fov: (horizontal, vertical) field of view of the camera in degrees
+        """
+        from .face_tracker import FaceTracker
+        self.stop_face_tracking()
+        if self._host_face_detection is not None:
+            faces = lambda timeout: self._host_face_detection.get_faces(True, timeout)
+        else:
+            faces = lambda timeout: self.detect_face()
+        self._face_tracker = FaceTracker(faces, self.turn, self.head_move if head else None, fov=fov, gain=gain,
+                                         max_rate=max_rate).start()
+
+    def stop_face_tracking(self):
+        """stop start_face_tracking().
+
+        :rtype: dict
+        :return: detections, detections without face (lost), commands sent and commands replaced
+                 before they were sent (superseded). None if not tracking.
+        """
+        if self._face_tracker is None:
+            return None
+        stats = self._face_tracker.stop()
+        self._face_tracker = None
+        return stats
+
     def _turn_and_see(self, angle, diff_x):
         width = 320
         self.turn(2, angle)
@@ -605,7 +836,9 @@ class Robot(object):
                         rb: right bottom point
                         ru: right upper point
         """
-        self._pattern_detection.detect_pattern(group=group, min_size=min_size, max_size=max_size)
+        if self._scene_gate is not None:
+            return self._scene_gate.call('pattern', (min_size, max_size, group), self._pattern_detection.detect_pattern)
+        return self._pattern_detection.detect_pattern(group=group, min_size=min_size, max_size=max_size)
 
     def get_pattern_location(self, index=0):
         """get three dimensional coordinate of pattern, you should detect_pattern() first.
@@ -672,15 +905,104 @@ class Robot(object):
         """open video data stream, you can capture a image from the data stream
         with get_image_from_video()
         """
-        self._video.open_video_data(Connection.yuvs)
+        self._video.open_video_data(self._connection.frames)
 
     def close_video_data(self):
         """close video data stream"""
         self._video.close_video_data()
 
-    def get_image_from_video(self):
+    def frames(self, max_fps=None, every_nth=1, size=None, color='bgr', roi=None):
+        """iterate over the new images of the video data, video data is opened if it is not open yet.
+
+            stream = robot.frames(max_fps=10, size=(320, 180), color='gray')
+            for image in stream:
+                ...
+            print(stream.skipped)
+
+        when the loop body is slower than the video, frames are skipped and the newest frame is
+        taken, stream.skipped counts them. the iteration stops when the video data is closed.
+
+        :param max_fps: at most max_fps images a second, default every frame
+        :param every_nth: only every nth frame of the video data, default 1
+        :param size: (width, height) of the images, default the size of the video
+        :param color: (bgr, rgb, gray)
+        :param roi: (x, y, width, height) region of the video, default all of it
+        :rtype: FrameStream
+        """
+        if not self._video.open:
+            self.open_video_data()
+        return FrameStream(self._video, max_fps, every_nth, size, color, roi)
+
+    def publish_frames(self, name=None, slots=4):
+        """share the video data with other processes, video data is opened if it is not open yet.
+        frames are written into shared memory, other processes read them without a copy:
+
+            # in another process
+            from gomer.shared_frames import SharedFrameSubscriber
+            for frame in SharedFrameSubscriber(name):
+                image = frame.image(size=(320, 180))
+
+        :param name: str, name of the shared memory, default a random one
+        :param slots: int, frames kept in the shared memory, default 4
+        :rtype: str
+        :return: name of the shared memory
+        """
+        from .shared_frames import SharedFramePublisher
+        self.stop_publishing_frames()
+        if not self._video.open:
+            self.open_video_data()
+        self._frame_publisher = SharedFramePublisher(name, slots)
+        self._connection.video_sinks.append(self._frame_publisher)
+        return self._frame_publisher.name
+
+    def stop_publishing_frames(self):
+        """stop publish_frames() and free the shared memory."""
+        if self._frame_publisher is None:
+            return
+        self._connection.video_sinks.remove(self._frame_publisher)
+        self._frame_publisher.close()
+        self._frame_publisher = None
+
+    def start_recording(self, path, fps=25, size=None):
+        """record the video data to a file, video data is opened if it is not open yet.
+        frames are encoded in another process, frames it can't keep up with are dropped. frames are
+        left out or repeated by their timestamps, so the file plays in real time at fps.
+
+        :param path: file of the video, .avi (MJPG), .mp4 (mp4v) or .mkv (XVID)
+        :param fps: frames per second of the file, default 25
+        :param size: (width, height) of the file, default the size of the video data
+        """
+        if not self._video.open:
+            self.open_video_data()
+        self._video.start_recording(path, fps, size)
+
+    def stop_recording(self):
+        """stop recording the video data.
+
+        :rtype: dict
+        :return: path of the file, frames written and frames dropped. None if not recording.
+        """
+        return self._video.stop_recording()
+
+    def get_image_from_video(self, wait_new=True, timeout=None, size=None, roi=None, color='bgr', copy=True):
         """get image from video, before you use this function, you must open_video_data() first.
 
-        :return: BGR data in opencv
+        :param wait_new: if True, wait for a frame newer than the one of the last image, so the same
+                         frame is never returned twice. if False, convert the newest frame at once.
+        :param timeout: seconds to wait for a new frame, None for no limit.
+        :param size: (width, height) of the image, e.g. (320, 180), default the size of the video
+        :param roi: (x, y, width, height) region of the video to convert, default all of it
+        :param color: (bgr, rgb)
+        :param copy: if False, return the image cached in the frame without a copy, it is read-only then.
+        :return: image data in opencv, None if there is no frame (yet).
+        """
+        return self._video.get_image(wait_new, timeout, size, roi, color, copy)
+
+    def get_gray_from_video(self, wait_new=True, timeout=None, size=None, roi=None):
+        """get the grayscale image (Y plane) from video, without color conversion or copy.
+
+        parameters are the same as get_image_from_video().
+
+        :return: 2D uint8 array, None if there is no frame (yet)
         """
-        return self._video.get_image()
+        return self._video.get_gray(wait_new, timeout, size, roi)
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+import cv2 as cv
+import numpy as np
+
+
+class SceneGate(object):
+    """skips detections on gomer while the view of the camera doesn't change.
+
+    the Y plane of the newest frame is taken at size before a detection and kept with its result.
+    at the next detection of the same kind with the same arguments the newest frame is compared
+    with it: the change score is the fraction of pixels whose gray level differs by more than
+    pixel_threshold. below threshold the scene is static and the kept result is returned without
+    asking gomer. only the newest detection of each kind is kept, it is the one gomer's
+    get_face_feature(), get_name() and get_pattern_location() refer to.
+    """
+
+    def __init__(self, frames, threshold=0.005, pixel_threshold=20, size=(160, 90), max_age=None):
+        """
+        :param frames: FrameRing of the video data
+        :param threshold: fraction of changed pixels from which the scene has changed
+        :param pixel_threshold: difference of gray levels from which a pixel has changed
+        :param size: (width, height) the frames are compared in
+        :param max_age: seconds a result is returned at most, default as long as the scene is static
+        """
+        self.logger = logging.getLogger('gomer.scene_gate')
+        self.frames = frames
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = tuple(size)
+        self.max_age = max_age
+        # kind: (args, reference gray image, time, result)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.score = None
+        self.lock = threading.Lock()
+
+    def reference(self):
+        """a copy of the newest frame at size, None before the first frame or if it was overwritten."""
+        frame = self.frames.latest()
+        if frame is None:
+            return None
+        gray = np.array(frame.gray(self.size))
+        return gray if frame.is_valid() else None
+
+    def change_score(self, a, b):
+        """fraction of the pixels of gray images a and b which differ by more than pixel_threshold."""
+        return float(np.count_nonzero(cv.absdiff(a, b) > self.pixel_threshold)) / a.size
+
+    def check(self, kind, args):
+        """whether the newest result of kind with args still holds.
+
+        :return: (True, result) if it does, else (False, reference) to pass to store() with the
+                 result of the detection.
+        """
+        reference = self.reference()
+        with self.lock:
+            entry = self.entries.get(kind)
+            if reference is not None and entry is not None and entry[0] == args and \
+                    (self.max_age is None or time.monotonic() - entry[2] < self.max_age):
+                self.score = self.change_score(reference, entry[1])
+                if self.score < self.threshold:
+                    self.hits += 1
+                    return True, entry[3]
+            self.misses += 1
+            return False, reference
+
+    def store(self, kind, args, reference, result):
+        """keep result of the detection of kind with args, made on the frame of reference."""
+        with self.lock:
+            if reference is None:
+                self.entries.pop(kind, None)
+            else:
+                self.entries[kind] = (args, reference, time.monotonic(), result)
+
+    def call(self, kind, args, detect):
+        """the result of detect(*args), the newest one of kind if the scene is static."""
+        hit, value = self.check(kind, args)
+        if hit:
+            return value
+        result = detect(*args)
+        self.store(kind, args, value, result)
+        return result
+
+    def invalidate(self, kind=None):
+        """forget the result of kind, default of all kinds."""
+        with self.lock:
+            if kind is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(kind, None)
+
+    def get_stats(self):
+        calls = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits / calls if calls else 0.0,
+                    score=self.score)
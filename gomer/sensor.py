@@ -6,8 +6,8 @@ from .exceptions import InvalidParameter
 
 
 class Sensor(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.sensor')
         self.group = 'sensor'
 
@@ -35,17 +35,17 @@ class Sensor(BaseFunction):
         b = int(b / 2.55)
         content = Content(item=ContentCode.SET_LIGHT_COLOR.value, prm1=r, prm2=b, prm3=g)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def light_on(self):
         content = Content(item=ContentCode.LIGHT_SWITCH.value, prm1=101)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def light_off(self):
         content = Content(item=ContentCode.LIGHT_SWITCH.value, prm1=100)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def set_light_mode(self, mode, duration, on_time, off_time):
         try:
@@ -64,17 +64,17 @@ class Sensor(BaseFunction):
             on_time = 65535
         content = Content(item=ContentCode.SET_LIGHT_MODE.value, prm1=mode, prm2=duration, prm3=on_time, prm4=off_time)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def turn_on_cliff_detection(self):
         content = Content(item=ContentCode.CLIFF_DETECT.value, prm1=101)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def turn_off_cliff_detection(self):
         content = Content(item=ContentCode.CLIFF_DETECT.value, prm1=100)
         message = SDKRequestMessage(content=content, block='all')
-        self.sender.send(message)
+        return self.sender.send(message)
 
     def read_infrared(self, location):
         try:
@@ -84,12 +84,14 @@ class Sensor(BaseFunction):
         index = dict(front=1, end=2).get(location)
         content = Content(item=ContentCode.INFRARED.value, prm1=index)
         message = SDKRequestMessage(content=content, block='all')
-        result = self.sender.send(message)
-        return result.get('prm2')
+        return self.sender.request(message, lambda result: result.get('prm2'))
 
     def read_gyroscope(self):
         content = Content(item=ContentCode.GYROSCOPE.value)
         message = SDKRequestMessage(content=content, block='all')
-        result = self.sender.send(message)
+        return self.sender.request(message, self.__parse_quaternion)
+
+    @staticmethod
+    def __parse_quaternion(result):
         return float(result.get("prm1")) / (1 << 30), float(result.get('prm2')) / (1 << 30), float(
             result.get('prm3')) / (1 << 30), float(result.get('prm4')) / (1 << 30)
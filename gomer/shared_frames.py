@@ -0,0 +1,195 @@
+"""video data in shared memory, for consumers in other processes.
+
+the publisher of the robot process copies every frame of the video data into a ring of slots in a
+multiprocessing.shared_memory block. subscribers attach to the block by its name and read the
+frames where they are, without a copy or pickling:
+
+    robot.publish_frames('gomer_frames')
+
+    # in another process
+    subscriber = SharedFrameSubscriber('gomer_frames')
+    for frame in subscriber:
+        gray = frame.gray((320, 180))
+"""
+from ctypes import memmove
+from multiprocessing import resource_tracker, shared_memory
+from .frames import Frame
+import logging
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+_MAGIC = 0x474f4d4552  # 'GOMER'
+# magic, slots, slot size, seq of the newest frame, 1 once the publisher is closed
+_HEADER = 5
+
+
+def attach_shared_memory(name):
+    """attach the shared memory created by another process, without making this process its owner."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # a process started by multiprocessing shares the resource tracker of its parent, which owns the
+    # memory. a process with a resource tracker of its own must not let it unlink the memory at exit.
+    own_tracker = getattr(resource_tracker._resource_tracker, '_fd', None) is None
+    memory = shared_memory.SharedMemory(name=name)
+    if own_tracker and os.name == 'posix':
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+def _layout(buf, slots, slot_size):
+    """header, seq, timestamp and (width, height) of each slot and the slots, as arrays over buf."""
+    offset = 0
+    header = np.ndarray(_HEADER, np.int64, buffer=buf, offset=offset)
+    offset += header.nbytes
+    sequences = np.ndarray(slots, np.int64, buffer=buf, offset=offset)
+    offset += sequences.nbytes
+    timestamps = np.ndarray(slots, np.float64, buffer=buf, offset=offset)
+    offset += timestamps.nbytes
+    sizes = np.ndarray((slots, 2), np.int64, buffer=buf, offset=offset)
+    offset += sizes.nbytes
+    data = np.ndarray((slots, slot_size), np.uint8, buffer=buf, offset=offset)
+    return header, sequences, timestamps, sizes, data
+
+
+def _size(slots, slot_size):
+    return (_HEADER + slots * 4) * 8 + slots * slot_size
+
+
+class SharedFramePublisher(object):
+    """writes the frames of the video data into a ring of slots in shared memory.
+
+    a slot is marked -1 while it is written, a subscriber checks the seq of the slot after reading it.
+    frames bigger than width x height are dropped.
+    """
+
+    def __init__(self, name=None, slots=4, width=1280, height=720):
+        self.logger = logging.getLogger('gomer.shared_frames')
+        self.slots = slots
+        self.slot_size = width * height * 3 // 2
+        self.memory = shared_memory.SharedMemory(name, create=True, size=_size(slots, self.slot_size))
+        self.name = self.memory.name
+        self.header, self.sequences, self.timestamps, self.sizes, self.data = _layout(
+            self.memory.buf, slots, self.slot_size)
+        self.sequences[:] = -1
+        self.header[:] = (_MAGIC, slots, self.slot_size, -1, 0)
+        self.seq = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def put(self, pointer, width, height):
+        """copy the I420 frame at pointer into the next slot, called on the thread of LibGlproto."""
+        size = width * height * 3 // 2
+        with self.lock:
+            if self.memory is None:
+                return
+            if size > self.slot_size:
+                self.dropped += 1
+                return
+            seq = self.seq
+            slot = seq % self.slots
+            self.sequences[slot] = -1
+            memmove(self.data[slot].ctypes.data, pointer, size)
+            self.timestamps[slot] = time.time()
+            self.sizes[slot] = (width, height)
+            self.sequences[slot] = seq
+            self.header[3] = seq
+            self.seq = seq + 1
+
+    def close(self):
+        """free the shared memory, subscribers see no new frames after it and stop iterating."""
+        with self.lock:
+            if self.memory is None:
+                return
+            # subscribers keep their mapping of the memory after it is unlinked and read the flag there
+            self.header[4] = 1
+            del self.header, self.sequences, self.timestamps, self.sizes, self.data
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+class SharedFrameSubscriber(object):
+    """reads the frames of a SharedFramePublisher, in any process on the computer.
+
+    frames are Frame objects whose data is a view of the shared slot, see Frame.is_valid().
+    iterating gives every new frame, skipping the frames which came while the consumer was busy,
+    and stops once the publisher is closed.
+    """
+
+    def __init__(self, name, poll=0.002):
+        """
+        :param name: name of the publisher
+        :param poll: seconds between two checks for a new frame
+        """
+        self.name = name
+        self.poll = poll
+        self.memory = attach_shared_memory(name)
+        header = np.ndarray(_HEADER, np.int64, buffer=self.memory.buf)
+        if header[0] != _MAGIC:
+            del header
+            self.memory.close()
+            raise ValueError('{} is not a shared memory of gomer frames.'.format(name))
+        slots, slot_size = int(header[1]), int(header[2])
+        del header
+        self.slots = slots
+        self.header, self.sequences, self.timestamps, self.sizes, self.data = _layout(
+            self.memory.buf, slots, slot_size)
+        self.last_seq = -1
+        self.skipped = 0
+
+    def latest(self):
+        """the newest frame, None before the first one."""
+        while True:
+            seq = int(self.header[3])
+            if seq < 0:
+                return None
+            slot = seq % self.slots
+            timestamp = float(self.timestamps[slot])
+            width, height = (int(value) for value in self.sizes[slot])
+            if self.sequences[slot] == seq:
+                return Frame(seq, timestamp, width, height, self.data[slot, :width * height * 3 // 2], slot, self)
+            # the publisher went on meanwhile, read the newer frame
+
+    def is_closed(self):
+        """whether the publisher is closed, no new frame comes then."""
+        return bool(self.header[4])
+
+    def wait_latest(self, after=-1, timeout=None):
+        """block until there is a frame newer than seq after and return the newest frame,
+        None after timeout seconds or once the publisher is closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.header[3] <= after:
+            if self.is_closed():
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll)
+        return self.latest()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        frame = self.wait_latest(self.last_seq)
+        if frame is None:
+            raise StopIteration
+        if self.last_seq >= 0:
+            self.skipped += frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        return frame
+
+    def close(self):
+        """detach from the shared memory, frames of the subscriber must not be used after it."""
+        if self.memory is None:
+            return
+        del self.header, self.sequences, self.timestamps, self.sizes, self.data
+        try:
+            self.memory.close()
+        except BufferError:
+            # frames still refer to it, it is closed when they are gone
+            pass
+        self.memory = None
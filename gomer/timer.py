@@ -0,0 +1,69 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class Timer(object):
+    """one daemon thread calling functions at their deadlines, kept in a heap.
+
+    call_later() returns an entry which can be given to cancel(). cancelled entries are dropped
+    when they are due, or all at once when they are the majority of the heap.
+    """
+
+    def __init__(self, name='gomer-timer'):
+        self.logger = logging.getLogger('gomer.timer')
+        self.name = name
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__cancelled = 0
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.monotonic() + delay, fn, *args)
+
+    def call_at(self, deadline, fn, *args):
+        """call fn(*args) on the timer thread at deadline (time.monotonic())."""
+        entry = [deadline, next(self.__counter), fn, args]
+        with self.__condition:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name=self.name)
+                self.__thread.daemon = True
+                self.__thread.start()
+            heapq.heappush(self.__heap, entry)
+            if self.__heap[0] is entry:
+                self.__condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self.__condition:
+            if entry[2] is None:
+                return
+            entry[2] = entry[3] = None
+            self.__cancelled += 1
+            if self.__cancelled > 64 and self.__cancelled * 2 > len(self.__heap):
+                self.__heap = [entry for entry in self.__heap if entry[2] is not None]
+                heapq.heapify(self.__heap)
+                self.__cancelled = 0
+
+    def __len__(self):
+        return len(self.__heap) - self.__cancelled
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__heap or self.__heap[0][0] > time.monotonic():
+                    timeout = self.__heap[0][0] - time.monotonic() if self.__heap else None
+                    self.__condition.wait(timeout)
+                entry = heapq.heappop(self.__heap)
+                fn, args = entry[2], entry[3]
+                if fn is None:
+                    self.__cancelled -= 1
+                    continue
+                entry[2] = entry[3] = None
+            try:
+                fn(*args)
+            except Exception:
+                self.logger.exception('timer callback failed.')
@@ -1,81 +1,221 @@
+import asyncio
 import logging
-from .message import Message, BlockStatus, ContentCode, MessageType, ResultCode
+from .message import Message, BlockStatus, ContentCode, MessageType, MessageKey, ResultCode
 import time
 from .connection import Connection
+from .config import Config
 import threading
-from collections import OrderedDict
-import json
+from collections import OrderedDict, deque
+from concurrent import futures
+import contextlib
+from queue import Empty, Queue
+from . import codec
 from .__version__ import MINIMUM_GOMER_VERSION
 import re
-from .exceptions import GomerNeedsUpdate
+from .exceptions import GomerNeedsUpdate, MessageNotRespond
+from .timer import Timer
+from .counter import is_before
 
 
 class SDKRequestMessageState:
-    __shared_dict = {}
+    """live messages of one gomer."""
 
-    def __init__(self):
-        self.__dict__ = self.__shared_dict
+    def __init__(self, window=None):
         self.block_set = set()
-        self.live_messages = OrderedDict()
-        # self.results =
+        # content num -> message
+        self.live_messages = {}
+        # group -> (content num -> message) in sending order
+        self.groups = {}
         self.logger = logging.getLogger('gomer.message_state')
+        self.lock = threading.Lock()
+        # notified whenever a message leaves the state, so senders waiting for their group can go on.
+        self.changed = threading.Condition(self.lock)
+        # slots for messages sent but not responded yet.
+        self.window = threading.BoundedSemaphore(window if window is not None else Config().get_window())
 
     def add_item(self, message):
         self.live_messages[message.content.num] = message
+        if message.group is not None:
+            self.groups.setdefault(message.group, OrderedDict())[message.content.num] = message
         self.add_to_set(message)
 
     def del_item(self, message):
         self.live_messages.pop(message.content.num)
+        group = self.groups.get(message.group)
+        if group is not None:
+            group.pop(message.content.num, None)
+            if not group:
+                del self.groups[message.group]
         if message.block == BlockStatus.NEVER.value or message.block == BlockStatus.ALL.value:
             return
         self.block_set.discard(message.group)
 
+    def pop_previous(self, message):
+        """remove and return the oldest live message sent before message in its group."""
+        group = self.groups.get(message.group)
+        if not group:
+            return None
+        num, previous = next(iter(group.items()))
+        if not is_before(num, message.content.num):
+            return None
+        self.del_item(previous)
+        return previous
+
+    def remove(self, message):
+        """remove message if it is live and wake up the senders waiting for its group."""
+        with self.changed:
+            if message.content.num in self.live_messages:
+                self.del_item(message)
+                self.changed.notify_all()
+
     def add_to_set(self, message):
         if message.block == BlockStatus.AUTO.value and message.block is not None:
             self.block_set.add(message.group)
 
 
-state = SDKRequestMessageState()
-_state_lock = threading.Lock()
+# deadlines of the live messages
+_deadlines = Timer('gomer-deadlines')
 
 
-class Handler:
+class HandlerStats:
+    """counters of the handler thread, times are in seconds."""
+
     def __init__(self):
+        self.messages = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.dispatch_time = 0.0
+        self.max_dispatch_time = 0.0
+
+    def record(self, size, elapsed):
+        self.messages += size
+        self.batches += 1
+        self.max_batch = max(self.max_batch, size)
+        self.dispatch_time += elapsed
+        self.max_dispatch_time = max(self.max_dispatch_time, elapsed)
+
+    def to_dict(self):
+        return dict(messages=self.messages, batches=self.batches, max_batch=self.max_batch,
+                    dispatch_time=self.dispatch_time, max_dispatch_time=self.max_dispatch_time)
+
+
+class Handler:
+    """dispatches the messages from the gomer of sender to the live messages of sender."""
+
+    def __init__(self, sender):
         self.logger = logging.getLogger('gomer.handler')
+        self.sender = sender
+        self.state = sender.state
         self.checked = False
+        # set once gomer answered the version check, version_error is the GomerNeedsUpdate of an old gomer
+        self.version_answered = threading.Event()
+        self.version_error = None
+        self.message_queue = None
+        # messages waiting for a Dispatcher thread
+        self.pending = deque()
+        self.scheduled = False
+        self.pending_lock = threading.Lock()
+        self.stats = HandlerStats()
+        # route by message key first, then by message type for sdk messages.
+        self.key_dispatchers = {
+            MessageKey.HARD.value: self.dispatch_hard,
+            MessageKey.SDKS.value: self.dispatch_sdks,
+        }
+        self.sdks_dispatchers = {
+            MessageType.RESPONSE.value: self.dispatch_response,
+            MessageType.REQUEST.value: self.dispatch_complete,
+        }
 
     def handle(self, message_queue):
-        global state, _state_lock
-        # live_messages = state.live_messages
+        """block on the queue and dispatch everything queued in one pass."""
+        self.message_queue = message_queue
         while True:
-            if not message_queue.empty():
-                message = json.loads(message_queue.get())
-                if not self.checked:
-                    if self.check_version(message):
-                        continue
-
-                message = Message.from_dict(message)
-                if message.content.num in state.live_messages.keys():
-                    if message.is_response():
-                        if state.live_messages[message.content.num].check_response(message):
-                            continue
-                    elif message.is_complete():
-                        if state.live_messages[message.content.num].completed:
-                            continue
-                        with _state_lock:
-                            if state.live_messages[message.content.num].check_complete(message):
-                                self.response_complete(message)
-                                if state.live_messages[message.content.num].block != BlockStatus.ALL.value:
-                                    state.del_item(state.live_messages[message.content.num])
-                    else:
-                        self.logger.info('....handler thread:do not konw the message type: ' + str(message))
-            else:
-                time.sleep(0.01)
+            messages = [message_queue.get()]
+            try:
+                while True:
+                    messages.append(message_queue.get_nowait())
+            except Empty:
+                pass
+            self.dispatch_all(messages)
+
+    def dispatch_all(self, messages):
+        start = time.perf_counter()
+        for message in messages:
+            try:
+                self.dispatch(message)
+            except Exception:
+                self.logger.exception('handler thread: fail to dispatch message: {}'.format(message))
+        self.stats.record(len(messages), time.perf_counter() - start)
+
+    def queue_depth(self):
+        if self.message_queue is None:
+            return len(self.pending)
+        return self.message_queue.qsize()
+
+    def get_stats(self):
+        stats = self.stats.to_dict()
+        stats['queue_depth'] = self.queue_depth()
+        return stats
+
+    def dispatch(self, message):
+        message = codec.loads(message)
+        for key in message:
+            dispatcher = self.key_dispatchers.get(key)
+            if dispatcher is not None:
+                dispatcher(message, key)
+                return
+
+    def dispatch_hard(self, message, key):
+        if self.checked:
+            return
+        try:
+            self.check_version(message)
+        except GomerNeedsUpdate as e:
+            # raised by wait_version() on the thread connecting gomer
+            self.version_error = e
+            self.logger.error(str(e))
+        finally:
+            self.version_answered.set()
+
+    def wait_version(self):
+        """block until gomer answered the version check, at most response_timeout (see config.ini) seconds,
+        raise GomerNeedsUpdate if gomer is too old.
+        """
+        if not self.version_answered.wait(Config().get_response_timeout() or None):
+            self.logger.warning('Gomer did not answer the version check.')
+        if self.version_error is not None:
+            raise self.version_error
+
+    def dispatch_sdks(self, message, key):
+        dispatcher = self.sdks_dispatchers.get(message.get('msgtype'))
+        if dispatcher is None:
+            self.logger.info('....handler thread:do not konw the message type: ' + str(message))
+            return
+        message = Message.from_dict(message, key)
+        live_message = self.state.live_messages.get(message.content.num)
+        if live_message is not None:
+            dispatcher(live_message, message)
+        elif message.message_type == MessageType.REQUEST.value:
+            # complete message of an instruction given up already (expired or interrupted),
+            # gomer still waits for its response.
+            self.response_complete(message)
+
+    def dispatch_response(self, live_message, message):
+        if not live_message.check_response(message):
+            # gomer refused the message, the sender gets the error from its completion.
+            self.state.remove(live_message)
+
+    def dispatch_complete(self, live_message, message):
+        if live_message.completed:
+            return
+        if live_message.check_complete(message):
+            self.response_complete(message)
+            self.state.remove(live_message)
 
     def response_complete(self, message):
         message.message_type = MessageType.RESPONSE.value
         message.code = ResultCode.SUCCESS.value
-        Connection().send(str(message))
+        self.sender.connection.send(message.encode())
 
     def check_version(self, message):
         if message.get('hard') is not None:
@@ -94,68 +234,262 @@ class Handler:
                                                MINIMUM_GOMER_VERSION[2]))
 
 
-class MessageSender:
+class Dispatcher(object):
+    """a pool of threads dispatching the messages of many gomers.
+
+    the messages of one handler are dispatched in order, by one thread at a time.
+    """
+
+    def __init__(self, workers=4):
+        self.logger = logging.getLogger('gomer.dispatcher')
+        self.ready = Queue()
+        for index in range(workers):
+            thread = threading.Thread(target=self.__run, name='gomer-dispatcher-{}'.format(index))
+            thread.daemon = True
+            thread.start()
+
+    def receiver(self, handler):
+        """the receiver of a connection, handing its messages to handler."""
+        def receive(message):
+            with handler.pending_lock:
+                handler.pending.append(message)
+                if handler.scheduled:
+                    return
+                handler.scheduled = True
+            self.ready.put(handler)
+        return receive
+
+    def __run(self):
+        while True:
+            handler = self.ready.get()
+            with handler.pending_lock:
+                messages, handler.pending = handler.pending, deque()
+            handler.dispatch_all(messages)
+            with handler.pending_lock:
+                # let the other handlers go first if more messages came meanwhile
+                handler.scheduled = bool(handler.pending)
+            if handler.scheduled:
+                self.ready.put(handler)
+
+
+class Batch(object):
+    """completions of the instructions sent in a MessageSender.batch()."""
+
     def __init__(self):
+        self.completions = []
+
+    def add(self, completion):
+        self.completions.append(completion)
+
+    def wait(self, timeout=None):
+        """wait for all the instructions, raise the first error of them.
+
+        :return: list of the contents of their complete messages, in sending order.
+        """
+        futures.wait(self.completions, timeout)
+        return [completion.result(0) for completion in self.completions]
+
+
+class MessageSender:
+    """sends the messages of one gomer and keeps its live messages."""
+
+    def __init__(self, connection=None):
         self.logger = logging.getLogger('gomer.message_sender')
-        global state, _state_lock
+        self.connection = connection if connection is not None else Connection()
+        self.state = SDKRequestMessageState()
+        # the batch of the current thread, see batch()
+        self._local = threading.local()
 
     def send_original(self, message):
-        Connection().send(message)
+        self.connection.send(message)
 
     def send(self, message):
-        self.logger.info("start message: {}".format(message))
+        """send a sdk request and return its completion.
+
+        messages are pipelined: returns once the message is on its way, at most `window` messages
+        (see config.ini) wait for their response at the same time. block 'all' messages return after
+        they are completed, except in a batch.
+        """
+        self.logger.info("start message: %s", message)
+        batch = getattr(self._local, 'batch', None)
         self.wait_for_send(message)
-        Connection().send(str(message))
-        with _state_lock:
-            state.add_item(message)
-        self.wait_for_response(message)
-        self.interrupt_previous_message(message)
-        if message.block == BlockStatus.ALL.value:
-            while not state.live_messages[message.content.num].completed:
-                time.sleep(0.01)
+        self.state.window.acquire()
+        message.completion.add_response_callback(lambda completion: self.on_response(message))
+        self.connection.send(message.encode())
+        self.set_deadline(message)
+        if batch is not None:
+            batch.add(message.completion)
+        elif message.block == BlockStatus.ALL.value:
+            message.completion.result()
             self.logger.info("message complete")
+        return message.completion
+
+    @contextlib.contextmanager
+    def batch(self):
+        """messages sent by this thread in the with block don't wait for each other,
+        all of them are waited for at the end of the block. messages of other senders
+        (other gomers) are not part of the batch.
+        """
+        batch = Batch()
+        previous = getattr(self._local, 'batch', None)
+        self._local.batch = batch
+        try:
+            yield batch
+        finally:
+            self._local.batch = previous
+        batch.wait()
 
-            complete_content = state.live_messages[message.content.num].complete_message.content.to_dict()
-            with _state_lock:
-                state.del_item(message)
-            return complete_content
-        return None
+    def on_response(self, message):
+        self.state.window.release()
+        if message.completion.responded() and not message.completion.done():
+            self.interrupt_previous_message(message)
+
+    def request(self, message, parse=None):
+        """send a sdk request, wait until it is completed and return parse(content of the complete message)."""
+        result = self.send(message).result()
+        return parse(result) if parse is not None else result
 
     def wait_for_send(self, message):
-        while message.group in state.block_set:
-            time.sleep(0.01)
+        """wait until the group of the message is free, then register the message."""
+        state = self.state
+        with state.changed:
+            state.changed.wait_for(lambda: message.group not in state.block_set)
+            state.add_item(message)
+
+    @staticmethod
+    def get_deadlines(message):
+        """seconds gomer may take to respond and to complete the message, None for no limit."""
+        config = Config()
+        timeout = message.get_timeout()
+        if timeout is not None:
+            complete = timeout + config.get_timeout_margin()
+        elif message.is_open_ended():
+            complete = config.get_open_ended_timeout() or None
+        else:
+            complete = config.get_timeout() or None
+        return config.get_response_timeout() or None, complete
+
+    def set_deadline(self, message):
+        """fail the message with MessageNotRespond if gomer doesn't respond or complete it in time,
+        counted from now, when the message is sent.
+        """
+        response, complete = self.get_deadlines(message)
+        if response is not None:
+            response_entry = _deadlines.call_later(response, self.expire, message, response, 'respond')
+            message.completion.add_response_callback(lambda completion: _deadlines.cancel(response_entry))
+        if complete is not None:
+            complete_entry = _deadlines.call_later(complete, self.expire, message, complete, 'complete')
+            message.completion.add_done_callback(lambda completion: _deadlines.cancel(complete_entry))
+
+    def expire(self, message, deadline, stage):
+        self.state.remove(message)
+        if message.completion.set_exception_if_pending(MessageNotRespond(
+                'Message not {} in {} seconds: {}'.format(stage, deadline, message))):
+            self.logger.error('Message not %s in %s seconds.', stage, deadline)
 
     def interrupt_previous_message(self, message):
-        if message.content.num not in state.live_messages.keys():
+        if message.group is None:
             return False
-        with _state_lock:
-            for key in state.live_messages.keys():
-                if key < message.content.num and state.live_messages[key].group == message.group:
-                    break
-                else:
-                    key = None
-            if key:
-                state.live_messages.pop(key)
-
-    def wait_for_response(self, message):
-        id = message.content.num
-        while id in state.live_messages.keys():
-            if state.live_messages[id].responsed:
-                return
-            time.sleep(0.01)
+        with self.state.lock:
+            if message.content.num not in self.state.live_messages:
+                return False
+            previous = self.state.pop_previous(message)
+        if previous is None:
+            return False
+        previous.interrupt()
+        return True
 
-    @staticmethod
-    def upload(file_type, path):
-        Connection().upload(file_type=file_type, path=path)
+    def upload(self, file_type, path):
+        self.connection.upload(file_type=file_type, path=path)
 
     def open_video(self):
-        Connection().open_video()
+        self.connection.open_video()
 
     def close_video(self):
-        Connection().close_video()
+        self.connection.close_video()
 
     def open_video_data(self):
-        Connection().open_video_data()
+        self.connection.open_video_data()
 
     def close_video_data(self):
-        Connection().close_video_data()
+        self.connection.close_video_data()
+
+
+class AsyncMessageSender(MessageSender):
+    """MessageSender for an asyncio event loop.
+
+    send() and request() schedule the message as a task on the loop and return it at once,
+    so an instruction is on its way even before it is awaited. Completions resolve the asyncio
+    futures kept here by content num, all of them on the loop thread.
+    """
+
+    def __init__(self, loop, connection=None):
+        super().__init__(connection)
+        self.logger = logging.getLogger('gomer.async_message_sender')
+        self.loop = loop
+        self.responses = {}
+        self.completions = {}
+        # replaced and set whenever a message is resolved, so senders waiting for their group can go on.
+        self._changed = asyncio.Event()
+
+    def send(self, message):
+        """schedule a sdk request, the task returns the asyncio future of its completion."""
+        return self.loop.create_task(self._send(message))
+
+    def request(self, message, parse=None):
+        """schedule a sdk request, the task returns parse(content of the complete message)."""
+        return self.loop.create_task(self._request(message, parse))
+
+    async def _request(self, message, parse):
+        completion = await self._send(message)
+        result = await completion
+        return parse(result) if parse is not None else result
+
+    async def _send(self, message):
+        self.logger.info("start message: %s", message)
+        await self.wait_for_send(message)
+        completion = self.completions[message.content.num]
+        self.connection.send(message.encode())
+        self.set_deadline(message)
+        await self.responses[message.content.num]
+        self.interrupt_previous_message(message)
+        if message.block == BlockStatus.ALL.value:
+            await completion
+            self.logger.info("message complete")
+        return completion
+
+    async def wait_for_send(self, message):
+        while message.group in self.state.block_set:
+            changed = self._changed
+            await changed.wait()
+        with self.state.lock:
+            self.state.add_item(message)
+        self.register(message)
+
+    def register(self, message):
+        num = message.content.num
+        self.responses[num] = self.loop.create_future()
+        self.completions[num] = self.loop.create_future()
+        message.completion.add_response_callback(
+            lambda completion: self.loop.call_soon_threadsafe(self.resolve_response, num, completion))
+        message.completion.add_done_callback(
+            lambda completion: self.loop.call_soon_threadsafe(self.resolve_completion, num, completion))
+
+    def resolve_response(self, num, completion):
+        future = self.responses.pop(num, None)
+        if future is None or future.done():
+            return
+        if completion.done() and completion.exception() is not None:
+            future.set_exception(completion.exception())
+        else:
+            future.set_result(None)
+
+    def resolve_completion(self, num, completion):
+        future = self.completions.pop(num, None)
+        if future is not None and not future.done():
+            if completion.exception() is not None:
+                future.set_exception(completion.exception())
+            else:
+                future.set_result(completion.result())
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
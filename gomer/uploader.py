@@ -25,8 +25,8 @@ class UploadResult(enum.Enum):
 
 
 class Uploader(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.uploader')
         self.image_types = ('jpg', 'jpeg', 'bmp', 'png')
         self.voice_types = ('mp3', 'wav')
@@ -1,15 +1,20 @@
 from gomer.base_function import *
-import cv2 as cv
-import numpy as np
-import threading
+from gomer.recorder import Recorder
+import asyncio
+import math
+import time
 
 
 class Video(BaseFunction):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, sender=None):
+        super().__init__(sender)
         self.logger = logging.getLogger('gomer.video')
         self.open = False
-        self.yuv = None
+        # FrameRing of the video data
+        self.frames = None
+        # seq of the frame returned last
+        self.last_seq = -1
+        self.recorder = None
 
     def open_video(self):
         self.sender.open_video()
@@ -17,27 +22,138 @@ class Video(BaseFunction):
     def close_video(self):
         self.sender.close_video()
 
-    def open_video_data(self, yuv_queue):
+    def open_video_data(self, frames):
         self.sender.open_video_data()
+        self.frames = frames
+        self.last_seq = -1
         self.open = True
-        video_thread = threading.Thread(target=self.handle_video_data, args=(yuv_queue,))
-        video_thread.setDaemon(True)
-        video_thread.start()
-
-    def handle_video_data(self, yuv_queue):
-        while self.open:
-            if not yuv_queue.empty():
-                self.yuv = yuv_queue.get()
-
-    def get_image(self):
-        height = 720
-        width = 1280
-        yuv = self.yuv
-        image_array = np.frombuffer(yuv, np.uint8)
-        yuv = np.reshape(image_array, (int(height * 3 / 2), int(width)))
-        new_img = cv.cvtColor(yuv, cv.COLOR_YUV2BGR_I420)
-        return new_img
+
+    def get_frame(self, wait_new=True, timeout=None):
+        """the newest Frame of the video data.
+
+        :param wait_new: if True, block until a frame newer than the frame returned last time comes,
+                         else return the newest frame at once.
+        :param timeout: seconds to wait for a new frame, None for no limit.
+        :return: Frame, None if there is no frame (yet).
+        """
+        if self.frames is None:
+            return None
+        if wait_new:
+            frame = self.frames.wait_latest(self.last_seq, timeout)
+        else:
+            frame = self.frames.latest()
+        if frame is not None:
+            self.last_seq = frame.seq
+        return frame
+
+    def get_image(self, wait_new=True, timeout=None, size=None, roi=None, color='bgr', copy=True):
+        """the newest frame converted to color, see Frame.image(). a writable copy unless copy is False."""
+        frame = self.get_frame(wait_new, timeout)
+        if frame is None:
+            return None
+        image = frame.image(color, size, roi)
+        return image.copy() if copy else image
+
+    def get_gray(self, wait_new=True, timeout=None, size=None, roi=None):
+        """the Y plane of the newest frame, see Frame.gray()."""
+        frame = self.get_frame(wait_new, timeout)
+        if frame is None:
+            return None
+        return frame.gray(size, roi)
+
+    def start_recording(self, path, fps=25, size=None):
+        self.stop_recording()
+        self.recorder = Recorder(self.frames, path, fps, size).start()
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return None
+        stats = self.recorder.stop()
+        self.recorder = None
+        return stats
 
     def close_video_data(self):
+        self.stop_recording()
         self.open = False
         self.sender.close_video_data()
+
+
+class FrameStream(object):
+    """iterator over the new frames of the video data, as images.
+
+        for image in robot.frames(max_fps=5, size=(320, 180), color='gray'):
+            ...
+
+    a frame is yielded at most max_fps times a second and only every_nth frame of the video data.
+    frames due by them which came while the consumer was still busy with the previous image are
+    skipped and counted in skipped, the consumer always gets the newest frame. also an async iterator, the
+    frames are waited for in an executor then. iteration stops when the video data is closed.
+    """
+
+    def __init__(self, video, max_fps=None, every_nth=1, size=None, color='bgr', roi=None):
+        self.video = video
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.every_nth = max(1, int(every_nth))
+        self.size = size
+        self.color = color
+        self.roi = roi
+        # due frames not yielded because the consumer was too slow for them
+        self.skipped = 0
+        self.count = 0
+        # Frame of the image yielded last
+        self.frame = None
+        self.__next_time = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        image = self.next_image()
+        if image is None:
+            raise StopIteration
+        return image
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        image = await asyncio.get_running_loop().run_in_executor(None, self.next_image)
+        if image is None:
+            raise StopAsyncIteration
+        return image
+
+    def next_image(self):
+        """block until the next image is due, None once the video data is closed."""
+        frames = self.video.frames
+        if frames is None:
+            return None
+        latest = frames.latest()
+        if self.frame is None:
+            wanted = latest.seq + 1 if latest is not None else 0
+        else:
+            wanted = self.frame.seq + self.every_nth
+            if latest is not None and latest.seq > wanted:
+                # frames between the due ones are left out on purpose, not skipped
+                step = self.every_nth
+                elapsed = latest.timestamp - self.frame.timestamp
+                if self.interval and elapsed > 0:
+                    rate = (latest.seq - self.frame.seq) / elapsed
+                    step = max(step, int(math.ceil(self.interval * rate)))
+                due = self.frame.seq + step
+                # the due frames before the newest one are skipped
+                self.skipped += max(0, (latest.seq - due + step - 1) // step)
+                wanted = latest.seq
+        delay = self.__next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        frame = None
+        while frame is None:
+            if not self.video.open:
+                return None
+            frame = frames.wait_latest(wanted - 1, 0.5)
+        self.__next_time = time.monotonic() + self.interval
+        self.frame = frame
+        self.count += 1
+        if self.color == 'gray':
+            return frame.gray(self.size, self.roi)
+        return frame.image(self.color, self.size, self.roi)
@@ -0,0 +1,70 @@
+"""gomer is simulated by the loopback backend, see gomer/loopback.py, so the tests need no gomer."""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gomer.config import Config
+
+Config().set('glproto', 'backend', 'loopback')
+Config().set('loopback', 'latency', 0.002)
+Config().set('loopback', 'jitter', 0)
+Config().set('loopback', 'execution_time', 0.02)
+
+
+def wait_until(predicate, timeout=2.0):
+    """poll predicate until it is true, return its last value."""
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def config():
+    """set(section, option, value) overrides an option of config.ini for one test."""
+    parser = Config().config
+    saved = []
+
+    def set(section, option, value):
+        if parser.has_option(section, option):
+            saved.append((section, option, parser.get(section, option)))
+        else:
+            saved.append((section, option, None))
+        Config().set(section, option, value)
+
+    yield set
+    for section, option, value in reversed(saved):
+        if value is None:
+            parser.remove_option(section, option)
+        else:
+            parser.set(section, option, value)
+
+
+@pytest.fixture
+def connect(config):
+    """connect(name) returns a Robot of a new loopback gomer, disconnected after the test."""
+    from gomer.robot import Robot
+    robots = []
+
+    def connect(name='Gomer_loopback', dispatcher=None):
+        robots.append(Robot(name, dispatcher))
+        return robots[-1]
+
+    yield connect
+    for robot in robots:
+        robot.disconnect()
+
+
+@pytest.fixture
+def robot(connect):
+    return connect()
+
+
+@pytest.fixture
+def loopback(robot):
+    """the LoopbackGlproto simulating the gomer of robot."""
+    return robot._connection._Connection__lib
@@ -0,0 +1,85 @@
+import pytest
+
+from gomer import connection
+from gomer.config import Config
+from gomer.connection import Connection
+from gomer.exceptions import ConnectionInUse, NoDevicesFound
+
+
+class FakeGlproto(object):
+    """LibGlproto64.dll finding a gomer only while found is True."""
+
+    def __init__(self):
+        self.found = False
+        self.connected = False
+
+    def ProtocolSearchDevice(self, respond_device_number, name_list):
+        return 1 if self.found else 0
+
+    def ProtocolConnectDevice(self, name, msg_callback):
+        self.connected = True
+        return 1
+
+    def ProtocolDestroyConnect(self):
+        self.connected = False
+        return 0
+
+    def ProtocolSendMessage(self, buf):
+        return 1
+
+
+@pytest.fixture
+def glproto(config, monkeypatch):
+    config('glproto', 'backend', 'dll')
+    lib = FakeGlproto()
+    monkeypatch.setattr(connection, 'load_glproto', lambda path: lib)
+    monkeypatch.setattr(Config, 'get_ready_time', lambda self: 0)
+    yield lib
+    Connection._dll_owner = None
+
+
+def test_failed_connect_releases_the_dll(glproto):
+    first = Connection()
+    with pytest.raises(NoDevicesFound):
+        first.connect('Gomer_a')
+    assert Connection._dll_owner is None
+    # another connection may try again
+    glproto.found = True
+    second = Connection()
+    second.connect('Gomer_a')
+    assert Connection._dll_owner is second
+
+
+def test_dll_connects_one_gomer(glproto):
+    glproto.found = True
+    first = Connection()
+    first.connect('Gomer_a')
+    with pytest.raises(ConnectionInUse):
+        Connection().connect('Gomer_b')
+    first.destroy()
+    assert Connection._dll_owner is None
+    Connection().connect('Gomer_b')
+
+
+def test_failed_second_connect_leaves_the_first_connected(glproto):
+    glproto.found = True
+    first = Connection()
+    first.connect('Gomer_a')
+    second = Connection()
+    with pytest.raises(ConnectionInUse):
+        second.connect('Gomer_b')
+    # what Robot.__del__ does after a failed connect
+    second.destroy()
+    assert glproto.connected
+    assert Connection._dll_owner is first
+    first.destroy()
+    assert not glproto.connected
+
+
+def test_loopback_connections_are_independent(config):
+    first, second = Connection(), Connection()
+    first.connect('Gomer_a')
+    second.connect('Gomer_b')
+    assert Connection._dll_owner is None
+    first.destroy()
+    second.destroy()
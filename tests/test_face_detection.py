@@ -0,0 +1,156 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from gomer.exceptions import InvalidParameter
+
+
+@pytest.fixture
+def faces(robot, loopback):
+    """robot with a face detected, registering it is possible."""
+    assert robot.detect_face(10, 300)
+    return robot
+
+
+def mirror(robot):
+    return robot.get_face_list()
+
+
+# face registry
+def test_face_list_loaded_from_gomer(robot, loopback):
+    loopback.faces[:] = ['a', 'b']
+    assert not robot._face_detection.face_list_loaded()
+    assert mirror(robot) == ['a', 'b']
+    # changed by another program, seen after sync_face_list()
+    loopback.faces.append('c')
+    assert mirror(robot) == ['a', 'b']
+    robot.sync_face_list()
+    assert mirror(robot) == ['a', 'b', 'c']
+
+
+def test_register(faces, loopback):
+    faces.register_face(0, 'a')
+    faces.register_face(0, 'b')
+    assert mirror(faces) == loopback.faces == ['a', 'b']
+
+
+def test_register_again_moves_name_to_the_end(faces, loopback):
+    for name in ('a', 'b', 'c'):
+        faces.register_face(0, name)
+    faces.register_face(0, 'a')
+    assert mirror(faces) == loopback.faces == ['b', 'c', 'a']
+
+
+def test_rename(faces, loopback):
+    for name in ('a', 'b'):
+        faces.register_face(0, name)
+    faces.rename('a', 'c')
+    assert mirror(faces) == loopback.faces == ['c', 'b']
+    # an unknown name changes nothing
+    faces.rename('x', 'y')
+    assert mirror(faces) == loopback.faces == ['c', 'b']
+
+
+def test_delete(faces, loopback):
+    for name in ('a', 'b'):
+        faces.register_face(0, name)
+    faces.delete_face('a')
+    assert mirror(faces) == loopback.faces == ['b']
+    with pytest.raises(InvalidParameter):
+        faces.delete_face('a')
+
+
+def test_register_evicts_least_recently_used(faces, loopback):
+    detection = faces._face_detection
+    names = ['n{}'.format(index) for index in range(detection.MAX_LEN)]
+    for name in names:
+        faces.register_face(0, name)
+    # registering n0 again makes n1 the least recently used one
+    faces.register_face(0, 'n0')
+    faces.register_face(0, 'new')
+    assert len(loopback.faces) == detection.MAX_LEN
+    assert 'n1' not in loopback.faces
+    assert mirror(faces) == loopback.faces == names[2:] + ['n0', 'new']
+
+
+def test_async_register_awaits_delete(config):
+    from gomer.async_robot import AsyncRobot
+
+    async def main():
+        async with AsyncRobot('Gomer_loopback') as robot:
+            loopback = robot._connection._Connection__lib
+            await robot.detect_face(10, 300)
+            for name in ('a', 'b', 'a'):
+                await robot.register_face(0, name)
+            return await robot.get_face_list(), list(loopback.faces)
+
+    faces, on_gomer = asyncio.run(main())
+    assert faces == on_gomer == ['b', 'a']
+
+
+# detect and identify
+def test_detect_and_identify(robot, loopback):
+    loopback.faces[:] = ['a']
+    result = robot.detect_and_identify()
+    assert result['boxes'] == [[140, 60, 40, 40]]
+    assert result['names'] == ['a']
+    assert len(result['landmarks']) == 1
+    result = robot.detect_and_identify(numpy=True)
+    assert result['boxes'].shape == (1, 4)
+    assert result['landmarks'].shape == (1, 5, 2)
+
+
+def test_async_detect_and_identify(config):
+    from gomer.async_robot import AsyncRobot
+
+    async def main():
+        async with AsyncRobot('Gomer_loopback') as robot:
+            robot._connection._Connection__lib.faces[:] = ['a']
+            return await robot.detect_and_identify()
+
+    result = asyncio.run(main())
+    assert result['boxes'] == [[140, 60, 40, 40]]
+    assert result['names'] == ['a']
+
+
+# similarity cache
+def test_similarity_matrix_is_cached(faces):
+    detection = faces._face_detection
+    files = ['f1', 'f2', 'f3']
+    for name in files:
+        faces.generate_face_feature_file(0, name)
+    _, requests = detection.similarity_requests(files)
+    # a pair and its reverse are one request
+    assert len(requests) == 3
+    matrix = faces.similarity_matrix(files)
+    assert matrix.shape == (3, 3)
+    assert np.all(np.diag(matrix) == 100)
+    assert np.array_equal(matrix, matrix.T)
+    assert matrix[0, 1] == faces.calc_similarity('f2', 'f1')
+    assert detection.similarity_requests(files)[1] == []
+
+
+def test_generating_a_file_invalidates_its_similarities(faces):
+    detection = faces._face_detection
+    files = ['f1', 'f2', 'f3']
+    for name in files:
+        faces.generate_face_feature_file(0, name)
+    faces.similarity_matrix(files)
+    faces.generate_face_feature_file(0, 'f1')
+    _, requests = detection.similarity_requests(files)
+    assert [pair for pair, _ in requests] == [('f1', 'f2'), ('f1', 'f3')]
+    cached = detection.cached_similarity_matrix(files)
+    assert np.isnan(cached[0, 1]) and np.isnan(cached[2, 0])
+    assert cached[1, 2] == cached[2, 1] and not np.isnan(cached[1, 2])
+    assert not np.isnan(faces.similarity_matrix(files)).any()
+
+
+def test_similarities_asked_before_a_file_is_generated_are_not_cached(faces):
+    detection = faces._face_detection
+    for name in ('f1', 'f2'):
+        faces.generate_face_feature_file(0, name)
+    generation, requests = detection.similarity_requests(['f1', 'f2'])
+    faces.generate_face_feature_file(0, 'f2')
+    detection.store_similarities(generation, [pair for pair, _ in requests], [{'prm1': 50}])
+    assert detection.similarity_requests(['f1', 'f2'])[1] != []
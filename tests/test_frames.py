@@ -0,0 +1,165 @@
+import threading
+from queue import Empty
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from gomer.frames import FrameRing
+from gomer.video import FrameStream
+
+WIDTH, HEIGHT = 64, 36
+
+
+def put(frames, value, width=WIDTH, height=HEIGHT):
+    """put a frame whose every byte is value, like the video data callback."""
+    yuv = np.full(width * height * 3 // 2, value, np.uint8)
+    return frames.put(yuv.ctypes.data, width, height)
+
+
+# FrameRing
+def test_ring_returns_frames_in_order():
+    frames = FrameRing(4, WIDTH, HEIGHT)
+    for value in range(3):
+        put(frames, value)
+    assert [frames.get(0).seq for _ in range(3)] == [0, 1, 2]
+    assert frames.empty()
+    with pytest.raises(Empty):
+        frames.get(0)
+
+
+def test_ring_drops_oldest_unread_frames():
+    frames = FrameRing(4, WIDTH, HEIGHT)
+    for value in range(7):
+        put(frames, value)
+    assert frames.dropped == 3
+    assert len(frames) == 4
+    read = [frames.get(0) for _ in range(4)]
+    assert [frame.seq for frame in read] == [3, 4, 5, 6]
+    assert [int(frame.data[0]) for frame in read] == [3, 4, 5, 6]
+    assert frames.latest().seq == 6
+
+
+def test_ring_overwritten_frame_is_invalid():
+    frames = FrameRing(2, WIDTH, HEIGHT)
+    first = put(frames, 1)
+    assert first.is_valid()
+    put(frames, 2)
+    put(frames, 3)
+    assert not first.is_valid()
+
+
+def test_ring_reallocates_for_bigger_frames():
+    frames = FrameRing(2, WIDTH // 2, HEIGHT // 2)
+    put(frames, 0, WIDTH // 2, HEIGHT // 2)
+    frame = put(frames, 1)
+    assert (frame.width, frame.height) == (WIDTH, HEIGHT)
+    assert int(frame.data[-1]) == 1
+    # the frames of the old size are gone
+    assert frames.get(0) is frame
+    assert frames.empty()
+
+
+def test_ring_wait_latest():
+    frames = FrameRing(2, WIDTH, HEIGHT)
+    assert frames.wait_latest(-1, 0.01) is None
+    threading.Timer(0.05, put, (frames, 0)).start()
+    assert frames.wait_latest(-1, 1).seq == 0
+    assert frames.wait_latest(0, 0.01) is None
+
+
+# FrameStream
+@pytest.fixture
+def video():
+    return SimpleNamespace(frames=FrameRing(8, WIDTH, HEIGHT), open=True)
+
+
+def test_stream_yields_new_frames(video):
+    stream = FrameStream(video, color='gray')
+    put(video.frames, 0)
+    # only frames coming after the stream started
+    threading.Timer(0.05, put, (video.frames, 1)).start()
+    image = stream.next_image()
+    assert stream.frame.seq == 1 and image.shape == (HEIGHT, WIDTH)
+    put(video.frames, 2)
+    stream.next_image()
+    assert stream.frame.seq == 2
+    assert (stream.count, stream.skipped) == (2, 0)
+
+
+def test_stream_skips_frames_of_a_slow_consumer(video):
+    stream = FrameStream(video, color='gray')
+    threading.Timer(0.05, put, (video.frames, 0)).start()
+    stream.next_image()
+    for value in range(1, 6):
+        put(video.frames, value)
+    # the newest frame is taken, the 4 before it are skipped
+    stream.next_image()
+    assert stream.frame.seq == 5
+    assert (stream.count, stream.skipped) == (2, 4)
+
+
+def test_stream_every_nth_frame_is_not_skipping(video):
+    stream = FrameStream(video, every_nth=2, color='gray')
+    threading.Timer(0.05, put, (video.frames, 0)).start()
+    stream.next_image()
+    put(video.frames, 1)
+    put(video.frames, 2)
+    stream.next_image()
+    assert stream.frame.seq == 2
+    assert stream.skipped == 0
+    for value in range(3, 8):
+        put(video.frames, value)
+    # frames 4 and 6 were due, they are skipped for the newest one
+    stream.next_image()
+    assert stream.frame.seq == 7
+    assert stream.skipped == 2
+
+
+def test_stream_max_fps_frames_are_not_skipping(video):
+    stream = FrameStream(video, max_fps=5, color='gray')
+    threading.Timer(0.05, put, (video.frames, 0)).start()
+    stream.next_image()
+    start = stream.frame.timestamp
+    for value in range(1, 13):
+        # 25 fps
+        put(video.frames, value).timestamp = start + value * 0.04
+    # every 5th frame is due, 5 and 10 are skipped for the newest one
+    stream.next_image()
+    assert stream.frame.seq == 12
+    assert stream.skipped == 2
+
+
+def test_stream_stops_when_video_is_closed(video):
+    stream = FrameStream(video, color='gray')
+    video.open = False
+    assert list(stream) == []
+
+
+# Frame
+@pytest.mark.parametrize('roi, shape', [((10, 10, 1, 1), (2, 2)), ((11, 7, 3, 1), (2, 2)), ((0, 0, 4, 4), (4, 4)),
+                                        ((62, 34, 8, 8), (2, 2)), ((-4, -4, 6, 6), (6, 6)),
+                                        ((WIDTH, HEIGHT, 4, 4), (2, 2))])
+def test_small_roi_is_clamped(roi, shape):
+    frame = put(FrameRing(2, WIDTH, HEIGHT), 128)
+    assert frame.image(roi=roi).shape == shape + (3,)
+    assert frame.gray(roi=roi).shape == shape
+
+
+@pytest.mark.parametrize('size', [(1, 1), (2, 2), (3, 1)])
+def test_tiny_size_of_small_roi(size):
+    frame = put(FrameRing(2, WIDTH, HEIGHT), 128)
+    assert frame.image(size=size, roi=(8, 8, 4, 4)).shape == (size[1], size[0], 3)
+    assert frame.image(size=size).shape == (size[1], size[0], 3)
+
+
+# Video
+def test_video_images_are_writable(robot):
+    robot.open_video_data()
+    try:
+        image = robot.get_image_from_video(timeout=2)
+        assert image.flags.writeable
+        image[:] = 0
+        assert not robot.get_image_from_video(wait_new=False, copy=False).flags.writeable
+    finally:
+        robot.close_video_data()
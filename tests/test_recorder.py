@@ -0,0 +1,24 @@
+import time
+
+import cv2 as cv
+import pytest
+
+
+@pytest.mark.parametrize('fps', [10, 50])
+def test_recording_plays_in_real_time(robot, tmp_path, fps):
+    # the loopback video data comes at 25 fps, the file is resampled to fps
+    path = str(tmp_path / 'record.avi')
+    robot.open_video_data()
+    assert robot.get_image_from_video(timeout=2) is not None
+    robot.start_recording(path, fps=fps, size=(160, 90))
+    start = time.monotonic()
+    time.sleep(2)
+    stats = robot.stop_recording()
+    duration = time.monotonic() - start
+    robot.close_video_data()
+    capture = cv.VideoCapture(path)
+    frames = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+    assert capture.get(cv.CAP_PROP_FPS) == pytest.approx(fps)
+    capture.release()
+    assert frames == stats['written']
+    assert frames / fps == pytest.approx(duration, abs=0.3)
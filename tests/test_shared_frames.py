@@ -0,0 +1,81 @@
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from gomer.shared_frames import SharedFramePublisher, SharedFrameSubscriber
+
+WIDTH, HEIGHT = 64, 36
+
+
+def put(publisher, value):
+    yuv = np.full(WIDTH * HEIGHT * 3 // 2, value, np.uint8)
+    publisher.put(yuv.ctypes.data, WIDTH, HEIGHT)
+
+
+def count_frames(name, started, result):
+    """subscriber process: count the frames until the publisher is closed."""
+    subscriber = SharedFrameSubscriber(name)
+    started.set()
+    count = sum(1 for _ in subscriber)
+    subscriber.close()
+    result.put(count)
+
+
+def test_subscriber_reads_frames():
+    publisher = SharedFramePublisher(slots=2, width=WIDTH, height=HEIGHT)
+    subscriber = SharedFrameSubscriber(publisher.name)
+    try:
+        assert subscriber.latest() is None
+        put(publisher, 7)
+        frame = next(subscriber)
+        assert (frame.seq, frame.width, frame.height) == (0, WIDTH, HEIGHT)
+        assert int(frame.data[0]) == 7
+        for value in range(3):
+            put(publisher, value)
+        # the newest frame, the ones before it are skipped
+        assert next(subscriber).seq == 3
+        assert subscriber.skipped == 2
+        assert subscriber.wait_latest(3, 0.01) is None
+    finally:
+        subscriber.close()
+        publisher.close()
+
+
+def test_subscriber_stops_when_publisher_closes():
+    publisher = SharedFramePublisher(slots=2, width=WIDTH, height=HEIGHT)
+    subscriber = SharedFrameSubscriber(publisher.name)
+    frames = []
+    thread = threading.Thread(target=lambda: frames.extend(frame.seq for frame in subscriber))
+    thread.daemon = True
+    thread.start()
+    put(publisher, 0)
+    time.sleep(0.05)
+    publisher.close()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert frames == [0]
+    assert subscriber.is_closed()
+    subscriber.close()
+
+
+def test_subscriber_process_stops_when_publisher_closes():
+    context = multiprocessing.get_context('spawn')
+    publisher = SharedFramePublisher(slots=2, width=WIDTH, height=HEIGHT)
+    started, result = context.Event(), context.Queue()
+    process = context.Process(target=count_frames, args=(publisher.name, started, result))
+    process.start()
+    try:
+        assert started.wait(10)
+        for value in range(3):
+            put(publisher, value)
+            time.sleep(0.05)
+    finally:
+        publisher.close()
+    process.join(10)
+    if process.is_alive():
+        process.terminate()
+        raise AssertionError('the subscriber did not stop')
+    assert process.exitcode == 0
+    assert result.get(1) == 3
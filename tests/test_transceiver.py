@@ -0,0 +1,304 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import pytest
+
+from conftest import wait_until
+from gomer import transceiver
+from gomer.exceptions import GomerNeedsUpdate, MessageNotRespond
+from gomer.message import Completion, Content, ContentCode, SDKRequestMessage
+from gomer.transceiver import Dispatcher, _deadlines
+
+
+def turn(block, group='wheel', timeout=3000):
+    content = Content(item=ContentCode.TURN.value, prm1=2, prm2=90, prm3=timeout)
+    return SDKRequestMessage(content=content, block=block, group=group)
+
+
+def infrared():
+    return SDKRequestMessage(content=Content(item=ContentCode.INFRARED.value, prm1=1), block='never')
+
+
+def settled(sender, deadlines):
+    """whether no message of sender is live and no deadline is left but the deadlines there were before."""
+    return not sender.state.live_messages and not sender.state.block_set and len(_deadlines) <= deadlines
+
+
+# block modes
+def test_all_returns_completed(robot, loopback):
+    loopback.execution_time = 0.1
+    start = time.monotonic()
+    completion = robot._sender.send(turn('all'))
+    assert time.monotonic() - start >= 0.1
+    assert completion.done()
+    assert completion.result()['item'] == ContentCode.TURN.value
+
+
+def test_auto_waits_for_previous_of_group(robot, loopback):
+    deadlines = len(_deadlines)
+    loopback.execution_time = 0.1
+    sender = robot._sender
+    first = sender.send(turn('auto'))
+    assert not first.done()
+    second = sender.send(turn('auto'))
+    # the second one is sent once the first one is completed, not interrupted
+    assert first.done() and first.result() is not None
+    assert second.result(1)['item'] == ContentCode.TURN.value
+    assert wait_until(lambda: settled(sender, deadlines))
+
+
+def test_auto_of_other_groups_run_at_the_same_time(robot, loopback):
+    loopback.execution_time = 0.5
+    sender = robot._sender
+    start = time.monotonic()
+    wheel = sender.send(turn('auto', 'wheel'))
+    head = sender.send(turn('auto', 'head'))
+    assert time.monotonic() - start < 0.3
+    assert wheel.result(1) is not None and head.result(1) is not None
+
+
+def test_never_interrupts_previous_of_group(robot, loopback):
+    deadlines = len(_deadlines)
+    loopback.execution_time = 0.2
+    sender = robot._sender
+    first = turn('never')
+    sender.send(first)
+    second = sender.send(turn('never'))
+    # resolved with None once gomer responds the second one
+    assert first.completion.result(1) is None
+    assert first.interrupted
+    assert second.result(1)['item'] == ContentCode.TURN.value
+    assert wait_until(lambda: settled(sender, deadlines))
+
+
+def test_never_doesnt_interrupt_other_groups(robot, loopback):
+    loopback.execution_time = 0.1
+    sender = robot._sender
+    wheel = turn('never', 'wheel')
+    sender.send(wheel)
+    head = sender.send(turn('never', 'head'))
+    assert wheel.completion.result(1) is not None
+    assert not wheel.interrupted
+    assert head.result(1) is not None
+
+
+# window
+def test_window_limits_messages_not_responded(connect, config):
+    deadlines = len(_deadlines)
+    config('sender', 'window', 2)
+    config('sender', 'response_timeout', 0.3)
+    robot = connect()
+    robot._connection._Connection__lib.drop_rate = 1.0
+    sender = robot._sender
+    start = time.monotonic()
+    completions = [sender.send(infrared()), sender.send(infrared())]
+    assert time.monotonic() - start < 0.2
+    # no slot is free until a deadline releases one
+    completions.append(sender.send(infrared()))
+    assert time.monotonic() - start >= 0.25
+    for completion in completions:
+        with pytest.raises(MessageNotRespond):
+            completion.result(2)
+    assert wait_until(lambda: settled(sender, deadlines))
+
+
+def test_window_slot_released_by_response(connect, config):
+    config('sender', 'window', 1)
+    robot = connect()
+    loopback = robot._connection._Connection__lib
+    loopback.execution_time = 0.6
+    sender = robot._sender
+    first = sender.send(infrared())
+    start = time.monotonic()
+    sender.send(infrared())
+    # waits for the response of the first one, not for its completion
+    assert time.monotonic() - start < 0.4
+    assert not first.done()
+    assert first.result(1) is not None
+
+
+# deadlines
+def test_deadline_evicts_message_not_responded(robot, loopback, config):
+    deadlines = len(_deadlines)
+    config('sender', 'response_timeout', 0.2)
+    loopback.drop_rate = 1.0
+    start = time.monotonic()
+    with pytest.raises(MessageNotRespond, match='not respond'):
+        robot.read_infrared('front')
+    assert 0.15 <= time.monotonic() - start < 1
+    assert wait_until(lambda: settled(robot._sender, deadlines))
+    loopback.drop_rate = 0.0
+    assert robot.read_infrared('front') is not None
+
+
+def test_deadline_evicts_message_not_completed(robot, loopback, config):
+    deadlines = len(_deadlines)
+    config('sender', 'timeout', 0.2)
+    loopback.execution_time = 0.5
+    with pytest.raises(MessageNotRespond, match='not complete'):
+        robot.read_infrared('front')
+    assert wait_until(lambda: settled(robot._sender, deadlines))
+    # the late complete message is acknowledged and dropped
+    time.sleep(0.4)
+    loopback.execution_time = 0.02
+    assert robot.read_infrared('front') is not None
+
+
+def test_deadline_of_timeout_parameter(robot, loopback, config):
+    config('sender', 'timeout', 0.1)
+    config('sender', 'timeout_margin', 0.1)
+    loopback.execution_time = 0.5
+    # 800 ms of the instruction plus the margin, the default timeout doesn't apply
+    assert robot._sender.send(turn('all', timeout=800)).result() is not None
+    with pytest.raises(MessageNotRespond, match='not complete'):
+        robot._sender.send(turn('all', timeout=100))
+
+
+def test_open_ended_message_has_no_completion_deadline(robot, loopback, config):
+    config('sender', 'timeout', 0.1)
+    loopback.execution_time = 0.3
+    content = Content(item=ContentCode.TTS.value, prmstr1='hello', prmstr2='hello')
+    completion = robot._sender.send(SDKRequestMessage(content=content, block='all'))
+    assert completion.result() is not None
+
+
+def test_deadlines_cancelled_on_completion(robot):
+    deadlines = len(_deadlines)
+    for _ in range(20):
+        robot.read_infrared('front')
+    assert wait_until(lambda: settled(robot._sender, deadlines))
+
+
+# completions
+def test_completion_callbacks_run_outside_the_lock():
+    completion = Completion()
+    results = []
+
+    def callback(completion):
+        # another thread touching the completion must not wait for this callback
+        thread = threading.Thread(target=lambda: results.append(
+            completion.set_exception_if_pending(RuntimeError())))
+        thread.start()
+        thread.join(1)
+        results.append(thread.is_alive())
+
+    completion.add_done_callback(callback)
+    assert completion.set_result_if_pending({})
+    assert results == [False, False]
+    assert completion.result() == {}
+
+
+def test_completion_resolved_once():
+    completion = Completion()
+    assert completion.cancel()
+    assert not completion.set_result_if_pending({})
+    assert not completion.set_exception_if_pending(RuntimeError())
+
+
+# batches
+def test_batch_waits_for_its_messages(robot, loopback):
+    loopback.execution_time = 0.5
+    sender = robot._sender
+    start = time.monotonic()
+    with sender.batch() as batch:
+        for _ in range(3):
+            sender.send(turn('all', group=None))
+        assert time.monotonic() - start < 0.3
+    assert len(batch.wait()) == 3
+
+
+def test_batch_is_per_sender(connect):
+    a, b = connect('Gomer_a'), connect('Gomer_b')
+    with a._sender.batch() as batch:
+        a._sender.send(turn('all', group=None))
+        completion = b._sender.send(turn('all', group=None))
+        # not part of the batch of a, so waited for at once
+        assert completion.done()
+    assert len(batch.completions) == 1
+
+
+# dispatcher
+class RecordingHandler(object):
+    """records the messages dispatched to it and whether it was dispatched by two threads at once."""
+
+    def __init__(self):
+        self.pending = deque()
+        self.pending_lock = threading.Lock()
+        self.scheduled = False
+        self.received = []
+        self.active = 0
+        self.overlapped = False
+
+    def dispatch_all(self, messages):
+        self.active += 1
+        if self.active > 1:
+            self.overlapped = True
+        time.sleep(0.0001)
+        self.received.extend(messages)
+        self.active -= 1
+
+
+def test_dispatcher_keeps_order_per_handler():
+    dispatcher = Dispatcher(workers=4)
+    handlers = [RecordingHandler() for _ in range(6)]
+    number = 500
+
+    def produce(handler):
+        receive = dispatcher.receiver(handler)
+        for index in range(number):
+            receive(index)
+
+    threads = [threading.Thread(target=produce, args=(handler,)) for handler in handlers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wait_until(lambda: all(len(handler.received) == number for handler in handlers), 5)
+    for handler in handlers:
+        assert handler.received == list(range(number))
+        assert not handler.overlapped
+
+
+def test_robots_sharing_a_dispatcher(connect):
+    dispatcher = Dispatcher(workers=2)
+    robots = [connect('Gomer_{}'.format(index), dispatcher) for index in range(3)]
+    for robot in robots:
+        robot._connection._Connection__lib.execution_time = 0.5
+    order = {robot: [] for robot in robots}
+    messages = {robot: [turn('never') for _ in range(5)] for robot in robots}
+    for index in range(5):
+        for robot in robots:
+            message = messages[robot][index]
+            message.completion.add_response_callback(lambda completion, robot=robot, index=index:
+                                                     order[robot].append(index))
+            robot._sender.send(message)
+    for robot in robots:
+        # every message but the last one of each robot is interrupted by the next one
+        assert messages[robot][-1].completion.result(2) is not None
+        assert [message.interrupted for message in messages[robot]] == [True] * 4 + [False]
+        assert order[robot] == list(range(5))
+
+
+# version check
+def test_old_gomer_is_rejected(connect, monkeypatch):
+    monkeypatch.setattr(transceiver, 'MINIMUM_GOMER_VERSION', (9, 0, 0))
+    with pytest.raises(GomerNeedsUpdate):
+        connect()
+
+
+def test_old_gomer_is_rejected_by_async_robot(config, monkeypatch):
+    from gomer.async_robot import AsyncRobot
+    monkeypatch.setattr(transceiver, 'MINIMUM_GOMER_VERSION', (9, 0, 0))
+
+    async def main():
+        async with AsyncRobot('Gomer_loopback'):
+            pass
+
+    with pytest.raises(GomerNeedsUpdate):
+        asyncio.run(main())
+
+
+def test_version_checked_at_connect(robot):
+    assert robot._Robot__handler.checked